@@ -1,11 +1,12 @@
 import os
 import sys
 import json
-import base64
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import branca.colormap as cm  # For linear colormap
+from plant_map import make_plant_map
+from thumbnails import THUMBNAIL_URL, ensure_thumbnails
 
 # -----------------------------------------------------------
 # Launch Streamlit App (if not already launched)
@@ -38,13 +39,10 @@ uploaded_file_soil = st.sidebar.file_uploader("Upload Soil Data JSON", type=["js
 # -----------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------
-def get_encoded_image(image_path):
-    """Encode an image to base64 for display in HTML."""
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
-    except FileNotFoundError:
-        return None
+def thumbnail_url(name):
+    """URL of a cached thumbnail. Absolute, because st_folium renders maps in a component iframe."""
+    base = st.get_option("server.baseUrlPath").strip("/")
+    return "/" + "/".join(part for part in (base, THUMBNAIL_URL, name) if part)
 
 def compute_bounds(coords):
     """Compute map bounds from a list of coordinates."""
@@ -62,103 +60,166 @@ def compute_center(coords):
         return [avg_lat, avg_lon]
     return [0, 0]
 
+# -----------------------------------------------------------
+# Cached Parsing and Map Building
+# -----------------------------------------------------------
+# Streamlit reruns this script on every widget interaction. Parsed tables are cached on
+# the uploaded file contents and maps on the contents plus the settings they depend on,
+# so an interaction only rebuilds what it changes.
+SOIL_SENSORS = ["sensor_1", "sensor_2"]
+
+@st.cache_data(show_spinner=False)
+def parse_plant_data(raw):
+    """Parse plant data JSON into flat rows: harmful and non-harmful plants with GPS, harmful plants without, bounds."""
+    plant_data = json.loads(raw).get("plant_data", [])
+    table = {"count": len(plant_data), "harmful": [], "nonharmful": [], "harmful_missing_gps": [], "bounds": None}
+    coords = []
+    for plant in plant_data:
+        try:
+            lat = float(plant.get("latitude"))
+            lon = float(plant.get("longitude"))
+        except (TypeError, ValueError):
+            lat = lon = None
+
+        custom_preds = plant.get("custom_predictions", [])
+        if not isinstance(custom_preds, list):
+            custom_preds = []
+        harmful = any((pred.get("plant_status") or "").lower() == "harmful" for pred in custom_preds)
+        row = {
+            "lat": lat,
+            "lon": lon,
+            "image_path": plant.get("image_path", ""),
+            "species": [(sp.get("species", "Unknown"), float(sp.get("confidence") or 0))
+                        for sp in plant.get("species_predictions", [])],
+            "custom": [(pred["classification"], float(pred.get("confidence") or 0))
+                       for pred in custom_preds if pred.get("classification") is not None],
+        }
+        if lat is not None and lon is not None:
+            table["harmful" if harmful else "nonharmful"].append(row)
+            coords.append((lat, lon))
+        elif harmful:
+            table["harmful_missing_gps"].append(row)
+    table["bounds"] = compute_bounds(coords)
+    return table
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_plant_map(raw, min_confidence):
+    """Plant map for a plant data file at a species confidence filter."""
+    table = parse_plant_data(raw)
+    names = ensure_thumbnails(plant["image_path"] for plant in table["harmful"] + table["nonharmful"])
+    thumbnails = {path: thumbnail_url(name) for path, name in names.items() if name}
+    return make_plant_map(table["harmful"], table["nonharmful"], table["bounds"], min_confidence, thumbnails)
+
+@st.cache_data(show_spinner=False)
+def parse_soil_data(raw):
+    """Flatten soil results into one row per reading, with the map centre and each parameter's value range."""
+    soil_results = json.loads(raw).get("soil_results", [])
+
+    # Extract soil sensor coordinates
+    soil_coords = []
+    for result in soil_results:
+        for sensor_key in SOIL_SENSORS:
+            gps = result.get(sensor_key, {}).get("GPS", {})
+            try:
+                soil_coords.append((float(gps.get("latitude")), float(gps.get("longitude"))))
+            except (TypeError, ValueError):
+                continue
+
+    # One row per reading, positioned by sensor 1's GPS, falling back to sensor 2's
+    rows = []
+    for result in soil_results:
+        sensor1 = result.get("sensor_1", {})
+        sensor2 = result.get("sensor_2", {})
+        gps1 = sensor1.get("GPS", {})
+        gps2 = sensor2.get("GPS", {})
+        try:
+            lat = float(gps1.get("latitude")) if gps1.get("latitude") else float(gps2.get("latitude"))
+            lon = float(gps1.get("longitude")) if gps1.get("longitude") else float(gps2.get("longitude"))
+        except (TypeError, ValueError):
+            continue
+        rows.append({"lat": lat, "lon": lon, "timestamp": result.get("timestamp", "N/A"),
+                     "sensor_1": sensor1, "sensor_2": sensor2})
+
+    # Min/max of each parameter over both sensors, for the colormaps
+    ranges = {}
+    for param in {key for result in soil_results for sensor in SOIL_SENSORS
+                  for key in result.get(sensor, {}) if key != "GPS"}:
+        values = [
+            float(result.get(sensor, {}).get(param))
+            for result in soil_results
+            for sensor in SOIL_SENSORS
+            if result.get(sensor, {}).get(param) is not None
+        ]
+        ranges[param] = (min(values), max(values)) if values else (0, 100)
+
+    return {"rows": rows, "center": compute_center(soil_coords), "ranges": ranges}
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def build_soil_map(raw, param, hazard_threshold):
+    """Map of one soil parameter, flagging readings whose sensors differ by more than hazard_threshold."""
+    table = parse_soil_data(raw)
+    data_min, data_max = table["ranges"].get(param, (0, 100))
+
+    # Create colormap
+    param_colormap = cm.LinearColormap(
+        colors=['blue', 'cyan', 'lime', 'yellow', 'orange', 'red'],
+        vmin=data_min, vmax=data_max
+    )
+
+    # Create map for the parameter
+    param_map = folium.Map(location=table["center"], zoom_start=13)
+    for row in table["rows"]:
+        val1 = row["sensor_1"].get(param)
+        val2 = row["sensor_2"].get(param)
+        avg_val = (float(val1) + float(val2)) / 2 if val1 and val2 else float(val1 or val2)
+        diff = abs(float(val1 or 0) - float(val2 or 0)) if val1 and val2 else 0
+
+        color = param_colormap(avg_val)
+        popup_text = f"<b>{param} Readings</b><br>Timestamp: {row['timestamp']}<br>"
+        if val1:
+            popup_text += f"Sensor 1: {val1}<br>"
+        if val2:
+            popup_text += f"Sensor 2: {val2}<br>"
+        if val1 and val2:
+            popup_text += f"<span style='color:red;'><b>Difference: {diff:.2f}</b></span><br>"
+
+        if val1 and val2 and diff > hazard_threshold:
+            folium.Marker(
+                location=[row["lat"], row["lon"]],
+                popup=folium.Popup(popup_text, max_width=400),
+                icon=folium.Icon(color='red', icon='exclamation-triangle', prefix='fa')
+            ).add_to(param_map)
+        else:
+            folium.CircleMarker(
+                location=[row["lat"], row["lon"]],
+                radius=8,
+                fill=True,
+                fill_color=color,
+                color=color,
+                fill_opacity=0.8,
+                tooltip=popup_text
+            ).add_to(param_map)
+    return param_map
+
 # -----------------------------------------------------------
 # Process Plant Data
 # -----------------------------------------------------------
-global_coords = []
-plant_data = []
 if uploaded_file_plant is not None:
     try:
-        data = json.load(uploaded_file_plant)
-        plant_data = data.get("plant_data", [])
+        plant_raw = uploaded_file_plant.getvalue()
+        plant_table = parse_plant_data(plant_raw)
         st.success("Plant Data file loaded")
 
-        harmful_valid = []
-        harmful_missing_gps = []
-        nonharmful_valid = []
-
-        # Process each plant entry
-        for plant in plant_data:
-            try:
-                lat = float(plant.get("latitude"))
-                lon = float(plant.get("longitude"))
-            except (TypeError, ValueError):
-                lat = lon = None
-
-            harmful = any(pred.get("plant_status", "").lower() == "harmful"
-                          for pred in plant.get("custom_predictions", []))
-
-            target_list = harmful_valid if harmful else nonharmful_valid
-            missing_list = harmful_missing_gps if harmful and (lat is None or lon is None) else None
-
-            if lat is not None and lon is not None:
-                target_list.append(plant)
-                global_coords.append((lat, lon))
-            elif missing_list is not None:
-                missing_list.append(plant)
-
         # Plot plants on the map
         st.subheader("Map: Plant life")
-        plant_map = folium.Map()
-
-        def plot_plants(plants, color, icon, status_label):
-            """Plot plants on the map with specific markers."""
-            for plant in plants:
-                preds = [sp for sp in plant.get("species_predictions", [])
-                         if sp.get("confidence", 0) >= min_confidence]
-                if not preds:
-                    continue
-                lat = float(plant.get("latitude"))
-                lon = float(plant.get("longitude"))
-                img_html = ''
-                img_path = plant.get("image_path", "")
-                img64 = get_encoded_image(img_path)
-                if img64:
-                    img_html = f'<img src="data:image/png;base64,{img64}" width="150" height="150"><br>'
-                    custom_preds = plant.get("custom_predictions", [])
-
-                    species_list = ", ".join(
-                    f"{sp['species']} ({sp['confidence']:.2f})" for sp in preds
-                    )
-                    
-                    custom_preds = plant.get("custom_predictions", [])
-                    if not isinstance(custom_preds, list):
-                        custom_preds = []
-
-                    custom_list = ", ".join(
-                        f"{(pred.get('classification') or 'Unknown')} ({float(pred.get('confidence') or 0):.2f})"
-                        for pred in custom_preds
-                        if pred.get('classification') is not None
-                    )
-
-
-
-                popup_html = (
-                    f"{img_html}"
-                    f"<b>Species:</b> {species_list}<br>"
-                    f"<b>Classifications:</b> {custom_list}<br>"
-                    f"{'Identified in custom labels and is likely harmful' if status_label == 'Harmful' else 'Not identified in custom labels and is likely not harmful'}"
-                )
-                popup = folium.Popup(popup_html, max_width=400)
-                folium.Marker(
-                    location=[lat, lon],
-                    popup=popup,
-                    icon=folium.Icon(color=color, icon=icon, prefix="fa")
-                ).add_to(plant_map)
-
-        plot_plants(harmful_valid, "red", "exclamation-triangle", "Harmful")
-        plot_plants(nonharmful_valid, "green", "leaf", "Non-Harmful")
-
-        plant_map.fit_bounds(compute_bounds(global_coords))
-        st_folium(plant_map, use_container_width=True, height=500)
+        st_folium(build_plant_map(plant_raw, min_confidence), use_container_width=True, height=500)
 
         # Display harmful plants missing GPS
+        harmful_missing_gps = plant_table["harmful_missing_gps"]
         if harmful_missing_gps:
             st.subheader("Harmful Plants Missing GPS")
             for i, plant in enumerate(harmful_missing_gps, 1):
-                species_list = ", ".join(
-                    sp.get("species", "Unknown") for sp in plant.get("species_predictions", [])
-                )
+                species_list = ", ".join(name for name, _ in plant["species"])
                 st.markdown(f"**{i}.** Species: {species_list}")
 
     except Exception as e:
@@ -171,24 +232,10 @@ else:
 # -----------------------------------------------------------
 if uploaded_file_soil is not None:
     try:
-        soil_data = json.load(uploaded_file_soil)
-        soil_results = soil_data.get("soil_results", [])
+        soil_raw = uploaded_file_soil.getvalue()
+        parse_soil_data(soil_raw)
         st.success("Soil Data file successfully loaded!")
 
-        # Extract soil sensor coordinates
-        soil_coords = []
-        for result in soil_results:
-            for sensor_key in ["sensor_1", "sensor_2"]:
-                sensor_item = result.get(sensor_key, {})
-                gps = sensor_item.get("GPS", {})
-                try:
-                    lat = float(gps.get("latitude"))
-                    lon = float(gps.get("longitude"))
-                    soil_coords.append((lat, lon))
-                except (TypeError, ValueError):
-                    continue
-        overall_soil_center = compute_center(soil_coords)
-
         # Define soil parameters and thresholds
         parameters = [
             "Moisture (%)", "Temperature (C)", "Conductivity (uS/cm)",
@@ -233,68 +280,7 @@ if uploaded_file_soil is not None:
                 col = columns[i % num_cols]
                 with col:
                     col.markdown(f"#### {param}")
-
-                    # Extract min/max values for the parameter
-                    all_values = [
-                        float(result.get(sensor, {}).get(param))
-                        for result in soil_results
-                        for sensor in ["sensor_1", "sensor_2"]
-                        if result.get(sensor, {}).get(param) is not None
-                    ]
-                    data_min, data_max = (min(all_values), max(all_values)) if all_values else (0, 100)
-
-                    # Create colormap
-                    param_colormap = cm.LinearColormap(
-                        colors=['blue', 'cyan', 'lime', 'yellow', 'orange', 'red'],
-                        vmin=data_min, vmax=data_max
-                    )
-
-                    # Create map for the parameter
-                    param_map = folium.Map(location=overall_soil_center, zoom_start=13)
-                    for result in soil_results:
-                        timestamp = result.get("timestamp", "N/A")
-                        sensor1 = result.get("sensor_1", {})
-                        sensor2 = result.get("sensor_2", {})
-                        gps1 = sensor1.get("GPS", {})
-                        gps2 = sensor2.get("GPS", {})
-
-                        try:
-                            lat = float(gps1.get("latitude")) if gps1.get("latitude") else float(gps2.get("latitude"))
-                            lon = float(gps1.get("longitude")) if gps1.get("longitude") else float(gps2.get("longitude"))
-                        except (TypeError, ValueError):
-                            continue
-
-                        val1 = sensor1.get(param)
-                        val2 = sensor2.get(param)
-                        avg_val = (float(val1) + float(val2)) / 2 if val1 and val2 else float(val1 or val2)
-                        diff = abs(float(val1 or 0) - float(val2 or 0)) if val1 and val2 else 0
-
-                        color = param_colormap(avg_val)
-                        popup_text = f"<b>{param} Readings</b><br>Timestamp: {timestamp}<br>"
-                        if val1:
-                            popup_text += f"Sensor 1: {val1}<br>"
-                        if val2:
-                            popup_text += f"Sensor 2: {val2}<br>"
-                        if val1 and val2:
-                            popup_text += f"<span style='color:red;'><b>Difference: {diff:.2f}</b></span><br>"
-
-                        if val1 and val2 and diff > hazard_thresholds[param]:
-                            folium.Marker(
-                                location=[lat, lon],
-                                popup=folium.Popup(popup_text, max_width=400),
-                                icon=folium.Icon(color='red', icon='exclamation-triangle', prefix='fa')
-                            ).add_to(param_map)
-                        else:
-                            folium.CircleMarker(
-                                location=[lat, lon],
-                                radius=8,
-                                fill=True,
-                                fill_color=color,
-                                color=color,
-                                fill_opacity=0.8,
-                                tooltip=popup_text
-                            ).add_to(param_map)
-
+                    param_map = build_soil_map(soil_raw, param, hazard_thresholds[param])
                     st_folium(param_map, use_container_width=True, height=500, key=f"{param}_map")
 
         else:
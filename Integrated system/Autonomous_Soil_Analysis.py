@@ -6,13 +6,13 @@ import sys
 import termios
 import tty
 from collections import deque
-import threading
 import serial
 import json
 import atexit
 from sensor_module import poll_all_sensors, append_results_to_json
-import cv2
-import os
+from rock_map import RockMap
+from camera_pipeline import CameraCaptureThread
+from frame_ring import CameraProcesses
 import csv
 
 
@@ -53,6 +53,12 @@ rolling_current = deque(maxlen=ROLLING_WINDOW_SIZE)
 current_when_rock = 350
 sensorTestTime = 60
 
+#rock memory - probe sites closer than this to a known rock are offset or skipped
+ROCK_MAP_FILE = "rock_map.json"
+ROCK_AVOID_RADIUS_M = 1.5
+rock_map = RockMap.load(ROCK_MAP_FILE)
+print(f"[INIT] Loaded {len(rock_map)} known rock positions")
+
 # Shared variable to safely stop the thread
 running = True
 
@@ -78,43 +84,33 @@ def log_current_to_file(elapsed_time, raw_current, current_value, filename="curr
 #        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 #    return ch
 
-class CameraCaptureThread(threading.Thread):
-    def __init__(self, camera_index=0, save_dir="/media/soil/Seagate Portable Drive/Images", interval=10):
-        super().__init__()
-        self.camera_index = camera_index
-        self.save_dir = save_dir
-        self.interval = interval
-        self._stop_event = threading.Event()
-
-        os.makedirs(self.save_dir, exist_ok=True)
-        self.cap = cv2.VideoCapture(self.camera_index)
-        if not self.cap.isOpened():
-            raise RuntimeError(f"Unable to open camera at index {self.camera_index}")
-
-    def run(self):
-        print("[CameraThread] Started camera capture thread.")
-        while not self._stop_event.is_set():
-            ret, frame = self.cap.read()
-            if ret:
-                timestamp = time.strftime("%Y%m%d-%H%M%S")
-                filename = f"capture_{timestamp}.jpg"
-                filepath = os.path.join(self.save_dir, filename)
-                cv2.imwrite(filepath, frame)
-                print(f"[CameraThread] Saved image: {filepath}")
-            else:
-                print("[CameraThread] Failed to read from camera.")
-
-            if self._stop_event.wait(self.interval):
-                break
-
-    def stop(self):
-        self._stop_event.set()
-
-    def release(self):
-        if self.cap.isOpened():
-            self.cap.release()
-        cv2.destroyAllWindows()
-        print("[CameraThread] Released camera resources.")
+def get_position():
+    """Return the rover's current (latitude, longitude), or (None, None) without a GPS fix."""
+    #Read position from RTU GPS once integrated
+    return None, None
+
+def record_rock(avg_current: float) -> None:
+    """Store a rock strike at the current position so later missions avoid it."""
+    lat, lon = get_position()
+    if lat is None or lon is None:
+        print("[WARN] No GPS fix, rock position not recorded.")
+        return
+    rock_map.record(lat, lon, avg_current)
+    rock_map.save()
+    print(f"[INFO] Rock recorded at {lat:.6f}, {lon:.6f} ({len(rock_map)} known)")
+
+def choose_probe_site():
+    """
+    Return the site to probe near the current position, offset away from known rocks.
+    Returns None if every nearby candidate is too close to a recorded rock.
+    """
+    lat, lon = get_position()
+    site = rock_map.choose_probe_site(lat, lon, ROCK_AVOID_RADIUS_M)
+    if site is None:
+        print("[INFO] Known rocks all around this position, skipping site.")
+    elif site != (lat, lon):
+        print(f"[INFO] Known rock nearby, offsetting probe site to {site[0]:.6f}, {site[1]:.6f}")
+    return site
 
 def sample_current()-> float:
     
@@ -136,7 +132,23 @@ atexit.register(camera_shutdown)
 print("Here 1")
 #Initialise Save File
 SAVE_DIR = '/media/soil/Seagate Portable Drive/Images'
-camera_thread = CameraCaptureThread(camera_index=0, save_dir=SAVE_DIR, interval=10)  # capture every 10 seconds
+# Images are staged on the SD card and flushed to the USB drive in batches
+STAGING_DIR = '/home/soil/image_staging'
+STAGING_MAX_BYTES = 2 * 1024 ** 3
+# Run the camera and image writing in their own processes, joined by a shared-memory frame ring,
+# instead of on a thread in this process. Off until bench_sampler_jitter.py shows it helps on the
+# rover: on a single-core machine the split made current-sampler jitter worse, not better.
+CAMERA_IN_SEPARATE_PROCESS = False
+if CAMERA_IN_SEPARATE_PROCESS:
+    camera_thread = CameraProcesses(camera_index=0, save_dir=SAVE_DIR, interval=None,  # burst at each probe site only
+                                    mjpeg_passthrough=True, burst_size=8, burst_keep=2,
+                                    staging_dir=STAGING_DIR, staging_max_bytes=STAGING_MAX_BYTES,
+                                    position_source=get_position)
+else:
+    camera_thread = CameraCaptureThread(camera_index=0, save_dir=SAVE_DIR, interval=None,  # burst at each probe site only
+                                        mjpeg_passthrough=True, burst_size=8, burst_keep=2,
+                                        staging_dir=STAGING_DIR, staging_max_bytes=STAGING_MAX_BYTES,
+                                        position_source=get_position)
 camera_thread.start()
 
 print("Here 2")
@@ -150,11 +162,21 @@ print("Serial init")
 
 #print("Use 'w' to move forward, 's' to move backward, and 'q' to quit.")
 
+# Probe site counter, used to tag site photos
+site_id = 0
+
 # Main loop
 try:
     while True:
         try:
-            
+            print("[STEP] Choosing probe site...")
+            site = choose_probe_site()
+            if site is None:
+                #Move RTU to new position (the rover cannot drive itself there yet)
+                print("[STOP] No rock-free probe site here and the rover cannot move on its own, stopping.")
+                break
+            #Move RTU to chosen site
+
             print("[STEP] Opening serial connection...")
             ser = serial.Serial(COM_PORT, BAUD_RATE, timeout=1)
             print("[OK] Serial connection opened.")
@@ -180,9 +202,10 @@ try:
 
                 if avg_current > current_when_rock:
                     print("[ALERT] Rock detected! Moving backward and retrying...")
+                    record_rock(avg_current)
                     motorDriver.testMove("backward")
                     time.sleep(40)
-                    #Move RTU to new position
+                    #Move RTU to new position (choose_probe_site() once navigation exists)
 
                     print("[STEP] Trying new position...")
                     motorDriver.testMove("forward")
@@ -202,6 +225,10 @@ try:
             motorDriver.probeMove("forward")
             time.sleep(30 + sensorTestTime)
 
+            # Probe is in the ground and the rover is still - photograph the site
+            site_id += 1
+            camera_thread.trigger_burst(site_id)
+
             # Sensor reading
             print("[STEP] Reading sensor data...")
             print("\nSensor 1 Data:")
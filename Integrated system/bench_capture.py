@@ -0,0 +1,141 @@
+"""
+Benchmark MJPEG passthrough capture against the decode/re-encode path.
+
+A recorded MJPEG stream (concatenated JPEG frames, as written by --record) stands in
+for the camera. The decode path mimics cv2.VideoCapture with RGB conversion on:
+each frame is decoded to BGR and re-encoded with cv2.imencode before writing.
+The passthrough path writes the camera's JPEG bytes unchanged.
+
+    python bench_capture.py --record stream.mjpeg --frames 200   # record from camera 0
+    python bench_capture.py --stream stream.mjpeg                # run the benchmark
+    python bench_capture.py --synthetic                          # no camera or recording needed
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from camera_pipeline import frame_to_jpeg, open_camera
+
+
+class MjpegFileCamera:
+    """Minimal cv2.VideoCapture stand-in that replays a recorded MJPEG stream in a loop."""
+    def __init__(self, path: str, passthrough: bool):
+        with open(path, "rb") as stream:
+            data = stream.read()
+        self.frames = split_mjpeg(data)
+        if not self.frames:
+            raise RuntimeError(f"No JPEG frames found in {path}")
+        self.passthrough = passthrough
+        self._pos = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        jpeg = self.frames[self._pos % len(self.frames)]
+        self._pos += 1
+        buf = np.frombuffer(jpeg, dtype=np.uint8)
+        if self.passthrough:
+            return True, buf.reshape(1, -1)
+        return True, cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    def release(self):
+        pass
+
+
+def split_mjpeg(data: bytes) -> list:
+    """Split a concatenated MJPEG stream into individual JPEG frames (SOI..EOI)."""
+    frames = []
+    start = data.find(b"\xff\xd8")
+    while start != -1:
+        end = data.find(b"\xff\xd9", start + 2)
+        if end == -1:
+            break
+        frames.append(data[start:end + 2])
+        start = data.find(b"\xff\xd8", end + 2)
+    return frames
+
+
+def record_stream(path: str, frames: int, camera_index: int, width: int, height: int, fps: float) -> None:
+    """Record raw camera MJPEG frames to path."""
+    cap = open_camera(camera_index, mjpeg_passthrough=True, width=width, height=height, fps=fps)
+    try:
+        with open(path, "wb") as stream:
+            for _ in range(frames):
+                ret, frame = cap.read()
+                if ret:
+                    stream.write(frame_to_jpeg(frame))
+    finally:
+        cap.release()
+    print(f"Recorded {frames} frames to {path}")
+
+
+def synthetic_stream(path: str, frames: int, width: int, height: int) -> None:
+    """Write a synthetic MJPEG stream of textured frames for camera-less runs."""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 3)
+    with open(path, "wb") as stream:
+        for i in range(frames):
+            frame = np.roll(base, i * 4, axis=1)
+            stream.write(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+
+
+def run(cap, frames: int, out_dir: str, jpeg_quality: int) -> dict:
+    """Capture and write frames; return wall/CPU time per frame and bytes written."""
+    written = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for i in range(frames):
+        ret, frame = cap.read()
+        data = frame_to_jpeg(frame, jpeg_quality)
+        with open(os.path.join(out_dir, f"frame_{i:05d}.jpg"), "wb") as img_file:
+            img_file.write(data)
+        written += len(data)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        "wall_ms_per_frame": 1000 * wall / frames,
+        "cpu_ms_per_frame": 1000 * cpu / frames,
+        "fps": frames / wall,
+        "mb_written": written / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream", help="Recorded MJPEG stream to replay")
+    parser.add_argument("--record", help="Record a stream from the camera to this path and exit")
+    parser.add_argument("--synthetic", action="store_true", help="Benchmark on a generated stream")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality for the re-encode path")
+    args = parser.parse_args()
+
+    if args.record:
+        record_stream(args.record, args.frames, args.camera, args.width, args.height, args.fps)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stream = args.stream
+        if args.synthetic or not stream:
+            stream = os.path.join(tmp, "synthetic.mjpeg")
+            synthetic_stream(stream, 30, args.width, args.height)
+
+        for name, passthrough in (("decode + re-encode", False), ("mjpeg passthrough", True)):
+            out_dir = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(out_dir)
+            stats = run(MjpegFileCamera(stream, passthrough), args.frames, out_dir, args.quality)
+            print(f"{name:20s} wall {stats['wall_ms_per_frame']:7.2f} ms/frame | "
+                  f"cpu {stats['cpu_ms_per_frame']:7.2f} ms/frame | "
+                  f"{stats['fps']:7.1f} fps | {stats['mb_written']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure current-sampler jitter with image work in the control process versus in separate processes.
+
+A stand-in for sample_current() runs on a fixed schedule in the main process while a
+synthetic image workload (decode, focus score, dHash, re-encode, write) runs:
+  none     - no image work
+  thread   - image work on a thread in the control process (the old single-process design)
+  process  - frames published by a camera process into a FrameRing and processed in another process
+
+    python bench_sampler_jitter.py --seconds 10 --rate 200
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from camera_pipeline import dhash, focus_score, frame_to_jpeg
+from frame_ring import FrameRing
+
+
+def synthetic_frame(width: int = 1280, height: int = 720) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 3)
+
+
+def image_work(frame: np.ndarray, out_dir: str, i: int) -> None:
+    """One frame's worth of on-rover image work."""
+    focus_score(frame)
+    dhash(frame)
+    with open(os.path.join(out_dir, f"{i % 16}.jpg"), "wb") as img_file:
+        img_file.write(frame_to_jpeg(frame))
+
+
+def thread_load(stop: threading.Event, out_dir: str) -> None:
+    frame = synthetic_frame()
+    i = 0
+    while not stop.is_set():
+        image_work(frame, out_dir, i)
+        i += 1
+
+
+def producer_main(ring_name: str, stop, fps: float) -> None:
+    ring = FrameRing(ring_name)
+    frame = synthetic_frame()
+    while not stop.is_set():
+        ring.publish(frame)
+        time.sleep(1 / fps)
+    ring.close()
+
+
+def consumer_main(ring_name: str, stop, out_dir: str) -> None:
+    ring = FrameRing(ring_name)
+    last = 0
+    while not stop.is_set():
+        seq = ring.write_seq
+        if seq == last:
+            time.sleep(0.001)
+            continue
+        found = ring.view(seq)
+        if found is not None:
+            image_work(found[1], out_dir, seq)
+            last = seq
+    ring.close()
+
+
+def run_sampler(seconds: float, rate: float) -> np.ndarray:
+    """Run a fixed-rate loop and return how late each tick fired, in ms."""
+    period = 1.0 / rate
+    lateness = []
+    start = time.perf_counter()
+    tick = 0
+    while True:
+        tick += 1
+        target = start + tick * period
+        if target - start > seconds:
+            break
+        remaining = target - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        lateness.append((time.perf_counter() - target) * 1000)
+        sum(range(50))  # the sampler's own small amount of Python work
+    return np.array(lateness)
+
+
+def report(name: str, lateness: np.ndarray) -> None:
+    print(f"{name:8s} ticks {len(lateness):6d} | p50 {np.percentile(lateness, 50):6.2f} ms | "
+          f"p99 {np.percentile(lateness, 99):6.2f} ms | max {lateness.max():7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=200, help="Sampler rate in Hz")
+    parser.add_argument("--fps", type=float, default=15, help="Camera frame rate for the process mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        report("none", run_sampler(args.seconds, args.rate))
+
+        stop = threading.Event()
+        worker = threading.Thread(target=thread_load, args=(stop, out_dir), daemon=True)
+        worker.start()
+        report("thread", run_sampler(args.seconds, args.rate))
+        stop.set()
+        worker.join()
+
+        ring = FrameRing(slots=8, slot_size=1280 * 720 * 3, create=True)
+        mp_stop = mp.Event()
+        procs = [mp.Process(target=producer_main, args=(ring.name, mp_stop, args.fps)),
+                 mp.Process(target=consumer_main, args=(ring.name, mp_stop, out_dir))]
+        for proc in procs:
+            proc.start()
+        time.sleep(0.5)
+        report("process", run_sampler(args.seconds, args.rate))
+        mp_stop.set()
+        for proc in procs:
+            proc.join()
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
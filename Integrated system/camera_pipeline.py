@@ -0,0 +1,440 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from image_store import ImageStore, StagedImageStore
+from perceptual_hash import dhash_gray, hamming
+
+# Standard Huffman tables from the JPEG spec (ITU T.81 Annex K.3).
+# Many UVC cameras omit the DHT segment from MJPEG frames and rely on these defaults.
+_DC_LUMA_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_DC_CHROMA_BITS = [0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+_DC_VALS = list(range(12))
+_AC_LUMA_BITS = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d]
+_AC_LUMA_VALS = [
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+]
+_AC_CHROMA_BITS = [0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77]
+_AC_CHROMA_VALS = [
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+]
+
+
+def _build_dht_segment() -> bytes:
+    """Build a single DHT marker segment holding all four standard tables."""
+    body = b""
+    for table_id, bits, vals in ((0x00, _DC_LUMA_BITS, _DC_VALS), (0x10, _AC_LUMA_BITS, _AC_LUMA_VALS),
+                                 (0x01, _DC_CHROMA_BITS, _DC_VALS), (0x11, _AC_CHROMA_BITS, _AC_CHROMA_VALS)):
+        body += bytes([table_id]) + bytes(bits) + bytes(vals)
+    return b"\xff\xc4" + (len(body) + 2).to_bytes(2, "big") + body
+
+
+_STD_DHT_SEGMENT = _build_dht_segment()
+
+
+def ensure_huffman_tables(jpeg: bytes) -> bytes:
+    """
+    Return jpeg with the standard Huffman tables inserted if the frame has none.
+    Frames that already carry a DHT segment are returned unchanged.
+    """
+    pos = 2
+    while pos + 4 <= len(jpeg) and jpeg[pos] == 0xFF:
+        marker = jpeg[pos + 1]
+        if marker == 0xC4:
+            return jpeg
+        if marker == 0xDA:
+            return jpeg[:pos] + _STD_DHT_SEGMENT + jpeg[pos:]
+        pos += 2 + int.from_bytes(jpeg[pos + 2:pos + 4], "big")
+    return jpeg
+
+
+def open_camera(camera_index: int = 0, mjpeg_passthrough: bool = False,
+                width: int = None, height: int = None, fps: float = None) -> cv2.VideoCapture:
+    """
+    Open a UVC camera and negotiate format, resolution and frame rate.
+    With mjpeg_passthrough the camera is put in MJPG mode and RGB conversion is disabled,
+    so read() returns the camera's compressed JPEG bytes instead of a decoded BGR frame.
+    """
+    if mjpeg_passthrough:
+        cap = cv2.VideoCapture(camera_index, cv2.CAP_V4L2)
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    else:
+        cap = cv2.VideoCapture(camera_index)
+    if width:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    if height:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    if not cap.isOpened():
+        raise RuntimeError(f"Unable to open camera at index {camera_index}")
+    if mjpeg_passthrough:
+        if int(cap.get(cv2.CAP_PROP_FOURCC)) == cv2.VideoWriter_fourcc(*"MJPG"):
+            cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        else:
+            print("[Camera] Camera did not accept MJPG, falling back to decoded frames.")
+    return cap
+
+
+def is_encoded(frame) -> bool:
+    """True if frame is a raw compressed buffer (MJPEG passthrough) rather than decoded pixels."""
+    return frame.ndim == 1 or (frame.ndim == 2 and frame.shape[0] == 1)
+
+
+def frame_to_jpeg(frame, jpeg_quality: int = 90) -> bytes:
+    """JPEG bytes for a frame: passthrough frames as-is, decoded frames re-encoded."""
+    if is_encoded(frame):
+        return ensure_huffman_tables(frame.tobytes())
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def decode_frame(frame, flags: int = cv2.IMREAD_COLOR):
+    """
+    Return pixels for a frame, decoding passthrough JPEG bytes only when needed.
+    Pass cv2.IMREAD_REDUCED_GRAYSCALE_4 etc. for cheap downscaled decodes.
+    """
+    if is_encoded(frame):
+        return cv2.imdecode(np.frombuffer(ensure_huffman_tables(frame.tobytes()), dtype=np.uint8), flags)
+    if flags != cv2.IMREAD_COLOR:
+        raise ValueError("Reduced decode flags only apply to passthrough frames")
+    return frame
+
+
+def focus_score(frame, max_width: int = 320) -> float:
+    """
+    Sharpness of a frame as the variance of the Laplacian on a small grayscale copy.
+    Higher is sharper; passthrough frames are decoded at reduced size to keep this cheap.
+    """
+    if is_encoded(frame):
+        gray = decode_frame(frame, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    else:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if gray.shape[1] > max_width:
+        height = int(gray.shape[0] * max_width / gray.shape[1])
+        gray = cv2.resize(gray, (max_width, height), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def capture_burst(grabber, count: int = 8, timeout: float = 1.0) -> list:
+    """Collect up to count consecutive new frames from a running FrameGrabber."""
+    frames = []
+    seq, _, _ = grabber.latest()
+    for _ in range(count):
+        latest = grabber.wait_for_frame(seq, timeout)
+        if latest is None:
+            break
+        seq = latest[0]
+        frames.append(latest)
+    return frames
+
+
+def select_sharpest(frames: list, keep: int = 2) -> list:
+    """Score (seq, timestamp, frame) tuples and return the best keep as (score, seq, timestamp, frame)."""
+    scored = [(focus_score(frame), seq, timestamp, frame) for seq, timestamp, frame in frames]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[:keep]
+
+
+def dhash(frame, hash_size: int = 8) -> int:
+    """Difference hash of a frame: hash_size*hash_size bits from a tiny grayscale thumbnail."""
+    if is_encoded(frame):
+        gray = decode_frame(frame, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    else:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return dhash_gray(gray, hash_size)
+
+
+class RecentHashIndex:
+    """
+    In-memory index of the hashes of recently kept frames.
+    A frame within max_distance bits of any of them counts as a near-duplicate.
+    """
+    def __init__(self, max_distance: int = 6, history: int = 32):
+        self.max_distance = max_distance
+        self._hashes = deque(maxlen=history)
+
+    def check(self, frame_hash: int):
+        """Return (is_duplicate, nearest distance); non-duplicates are added to the index."""
+        nearest = min((hamming(frame_hash, h) for h in self._hashes), default=None)
+        if nearest is not None and nearest <= self.max_distance:
+            return True, nearest
+        self._hashes.append(frame_hash)
+        return False, nearest
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Thread that reads the camera continuously and keeps only the freshest frame.
+    Draining the driver queue this way stops V4L2 handing back stale buffered frames.
+    """
+    def __init__(self, cap: cv2.VideoCapture):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self._stop_event = threading.Event()
+        self._new_frame = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = None
+        self.read_failures = 0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                self.read_failures += 1
+                self._stop_event.wait(0.1)
+                continue
+            with self._new_frame:
+                self._frame = frame
+                self._seq += 1
+                self._timestamp = time.time()
+                self._new_frame.notify_all()
+
+    def latest(self):
+        """Return (sequence number, capture time, frame) of the newest frame."""
+        with self._new_frame:
+            return self._seq, self._timestamp, self._frame
+
+    def wait_for_frame(self, after_seq: int, timeout: float = 1.0):
+        """Block until a frame newer than after_seq arrives; returns latest() or None on timeout."""
+        with self._new_frame:
+            if not self._new_frame.wait_for(lambda: self._seq > after_seq, timeout):
+                return None
+            return self._seq, self._timestamp, self._frame
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class FrameWriterPool:
+    """
+    Bounded queue feeding a small pool of JPEG encoder/writer threads.
+    MJPEG passthrough frames are written as-is; decoded frames are encoded at jpeg_quality.
+    Images are saved through an ImageStore, which names, shards and indexes them.
+    submit() never blocks: when the disk falls behind, frames are dropped and counted.
+    """
+    def __init__(self, store, workers: int = 2, max_queue: int = 8, jpeg_quality: int = 90):
+        self.store = store
+        self.jpeg_quality = jpeg_quality
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, frame, **metadata) -> bool:
+        """
+        Queue a frame for writing; metadata is passed on to ImageStore.write().
+        Returns False if the queue was full and the frame dropped.
+        """
+        try:
+            self._queue.put_nowait((frame, metadata))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, metadata = item
+            try:
+                self.store.write(frame_to_jpeg(frame, self.jpeg_quality), **metadata)
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"[WriterPool] Error writing frame: {e}")
+
+    def stats(self) -> dict:
+        """Queue depth and frame counters for monitoring disk back-pressure."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def stop(self):
+        """Drain queued frames, then stop the workers."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+class CameraCaptureThread(threading.Thread):
+    """
+    Camera capture in two modes: a photo every `interval` seconds, and/or event-driven
+    bursts triggered with trigger_burst(site_id) that keep only the sharpest frames.
+    Pass interval=None for event-only capture.
+    Interval frames that are near-duplicates of recent ones (perceptual hash) are
+    suppressed, or only tagged in the manifest with dedupe="tag".
+    Images are saved through an ImageStore with the position from position_source(),
+    or staged locally in staging_dir and flushed to save_dir in batches (StagedImageStore).
+    Frames come from the camera via a FrameGrabber, or from frame_source (any object
+    with the FrameGrabber interface, e.g. a shared-memory ring) when one is given.
+    """
+    def __init__(self, camera_index=0, save_dir="/media/soil/Seagate Portable Drive/Images", interval=10,
+                 writer_workers=2, max_queue=8, jpeg_quality=90,
+                 mjpeg_passthrough=False, width=None, height=None, fps=None,
+                 burst_size=8, burst_keep=2, dedupe="suppress", dedupe_distance=6, position_source=None,
+                 frame_source=None, staging_dir=None, staging_max_bytes=2 * 1024 ** 3):
+        super().__init__()
+        self.camera_index = camera_index
+        self.save_dir = save_dir
+        self.interval = interval
+        self.burst_size = burst_size
+        self.burst_keep = burst_keep
+        self._stop_event = threading.Event()
+        self._bursts = queue.Queue()
+        self.dedupe = dedupe
+        self.recent_hashes = RecentHashIndex(max_distance=dedupe_distance)
+        self.duplicates = 0
+        self.position_source = position_source
+
+        if staging_dir:
+            self.store = StagedImageStore(self.save_dir, staging_dir, staging_max_bytes=staging_max_bytes)
+        else:
+            self.store = ImageStore(self.save_dir)
+        if frame_source is not None:
+            self.cap = None
+            self.grabber = frame_source
+        else:
+            # In passthrough mode frames stay camera-compressed JPEG and are never decoded here
+            self.cap = open_camera(self.camera_index, mjpeg_passthrough=mjpeg_passthrough,
+                                   width=width, height=height, fps=fps)
+            # Grabber keeps the freshest frame; writers encode and save off the capture path
+            self.grabber = FrameGrabber(self.cap)
+        self.writer = FrameWriterPool(self.store, workers=writer_workers,
+                                      max_queue=max_queue, jpeg_quality=jpeg_quality)
+
+    def trigger_burst(self, site_id, position=None):
+        """
+        Request a burst at a probe site; returns immediately.
+        position (lat, lon) overrides position_source, e.g. when sent from another process.
+        """
+        self._bursts.put((site_id, position))
+
+    def run(self):
+        print("[CameraThread] Started camera capture thread.")
+        self.grabber.start()
+        self.writer.start()
+        last_seq = 0
+        next_interval = time.monotonic() if self.interval else None
+        while not self._stop_event.is_set():
+            timeout = max(0.0, next_interval - time.monotonic()) if next_interval else None
+            try:
+                burst = self._bursts.get(timeout=timeout)
+            except queue.Empty:
+                burst = None
+
+            if burst is not None:
+                self._capture_burst(*burst)
+                continue
+            if self._stop_event.is_set():
+                break
+
+            next_interval = time.monotonic() + self.interval
+            seq, frame_time, frame = self.grabber.latest()
+            if frame is None or seq == last_seq:
+                print("[CameraThread] No new frame from camera.")
+            else:
+                last_seq = seq
+                metadata = self._metadata(frame_time)
+                if self.dedupe:
+                    metadata["dhash"] = dhash(frame)
+                    duplicate, distance = self.recent_hashes.check(metadata["dhash"])
+                    if duplicate:
+                        self.duplicates += 1
+                        if self.dedupe == "suppress":
+                            print(f"[CameraThread] Skipped near-duplicate frame (distance {distance}).")
+                            continue
+                        metadata["tags"] = ["duplicate"]
+                if self.writer.submit(frame, **metadata):
+                    print("[CameraThread] Queued image.")
+                else:
+                    print(f"[CameraThread] Writer queue full, dropped frame. {self.writer.stats()}")
+
+    def _capture_burst(self, site_id, position=None):
+        frames = capture_burst(self.grabber, self.burst_size)
+        if not frames:
+            print(f"[CameraThread] No frames captured for site {site_id}.")
+            return
+        best = select_sharpest(frames, self.burst_keep)
+        for rank, (score, _, frame_time, frame) in enumerate(best, start=1):
+            metadata = self._metadata(frame_time, position, site_id=site_id, focus=round(score, 1), rank=rank)
+            if not self.writer.submit(frame, **metadata):
+                print(f"[CameraThread] Writer queue full, dropped frame. {self.writer.stats()}")
+        scores = ", ".join(f"{score:.0f}" for score, *_ in best)
+        print(f"[CameraThread] Site {site_id}: kept {len(best)}/{len(frames)} frames (focus {scores})")
+
+    def _metadata(self, captured_at, position=None, **extra) -> dict:
+        if position is None:
+            position = self.position_source() if self.position_source else (None, None)
+        latitude, longitude = position
+        return dict(captured_at=captured_at, latitude=latitude, longitude=longitude, **extra)
+
+    def stats(self) -> dict:
+        stats = self.writer.stats()
+        stats["read_failures"] = self.grabber.read_failures
+        stats["duplicates"] = self.duplicates
+        stats.update(self.store.stats())
+        return stats
+
+    def stop(self):
+        self._stop_event.set()
+        self._bursts.put(None)
+
+    def release(self):
+        self.grabber.stop()
+        self.grabber.join(timeout=2)
+        self.writer.stop()
+        self.store.close()
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.release()
+        print(f"[CameraThread] Released camera resources. {self.stats()}")
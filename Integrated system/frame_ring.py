@@ -0,0 +1,245 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from camera_pipeline import CameraCaptureThread, open_camera
+
+# Per-slot metadata columns
+_SEQ, _NBYTES, _HEIGHT, _WIDTH, _CHANNELS = range(5)
+_SLOT_FIELDS = 5
+_HEADER_INTS = 4   # write_seq, slots, slot_size, oversized frames skipped
+
+
+class FrameRing:
+    """
+    Fixed-size ring of frames in multiprocessing shared memory.
+    One producer publishes frames with increasing sequence numbers; any number of
+    reader processes can look at the newest frame without copying it through a pipe.
+    A slot's sequence number is cleared while it is being written and re-checked by
+    readers after use, so torn reads are detected rather than returned.
+    Frames larger than a slot are skipped and counted in `oversized`.
+    """
+    def __init__(self, name: str = None, slots: int = 8, slot_size: int = 1280 * 720 * 3, create: bool = False):
+        if create:
+            size = self._layout_size(slots, slot_size)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self._map(slots, slot_size)
+            self._header[:] = (0, slots, slot_size, 0)
+            self._table[:] = 0
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=self.shm.buf)
+            self._map(int(header[1]), int(header[2]))
+        self.name = self.shm.name
+        self.owner = create
+        self.closed = False
+
+    @staticmethod
+    def _layout_size(slots: int, slot_size: int) -> int:
+        return 8 * (_HEADER_INTS + slots * _SLOT_FIELDS + slots) + slots * slot_size
+
+    def _map(self, slots: int, slot_size: int) -> None:
+        self.slots = slots
+        self.slot_size = slot_size
+        buf = self.shm.buf
+        offset = 0
+        self._header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * _HEADER_INTS
+        self._table = np.ndarray((slots, _SLOT_FIELDS), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * slots * _SLOT_FIELDS
+        self._times = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self._data = np.ndarray((slots, slot_size), dtype=np.uint8, buffer=buf, offset=offset)
+
+    @property
+    def write_seq(self) -> int:
+        return int(self._header[0])
+
+    @property
+    def oversized(self) -> int:
+        """Frames skipped by publish() because they did not fit in a slot."""
+        return int(self._header[3])
+
+    def publish(self, frame: np.ndarray, timestamp: float = None):
+        """
+        Copy a frame (decoded pixels or passthrough JPEG bytes) into the next slot; returns its seq.
+        A frame larger than a slot is skipped and counted, and None is returned.
+        """
+        if frame.nbytes > self.slot_size:
+            self._header[3] += 1
+            return None
+        seq = self.write_seq + 1
+        slot = seq % self.slots
+        row = self._table[slot]
+        row[_SEQ] = 0
+        self._data[slot, :frame.nbytes] = frame.reshape(-1)
+        shape = frame.shape + (1,) * (3 - frame.ndim)
+        row[_NBYTES] = frame.nbytes
+        row[_HEIGHT], row[_WIDTH], row[_CHANNELS] = shape
+        self._times[slot] = timestamp if timestamp is not None else time.time()
+        row[_SEQ] = seq
+        self._header[0] = seq
+        return seq
+
+    def view(self, seq: int):
+        """
+        Zero-copy (timestamp, frame view) for seq, or None if it is not in the ring.
+        The view aliases shared memory: call is_valid(seq) after using it.
+        """
+        slot = seq % self.slots
+        row = self._table[slot]
+        if row[_SEQ] != seq:
+            return None
+        height, width, channels = int(row[_HEIGHT]), int(row[_WIDTH]), int(row[_CHANNELS])
+        frame = self._data[slot, :int(row[_NBYTES])]
+        frame = frame.reshape((height, width) if channels == 1 else (height, width, channels))
+        return float(self._times[slot]), frame
+
+    def is_valid(self, seq: int) -> bool:
+        """True if seq has not been overwritten since it was read."""
+        return self._table[seq % self.slots, _SEQ] == seq
+
+    def read(self, seq: int):
+        """Copy of (timestamp, frame) for seq, or None if it was overwritten."""
+        found = self.view(seq)
+        if found is None:
+            return None
+        timestamp, frame = found
+        frame = frame.copy()
+        return (timestamp, frame) if self.is_valid(seq) else None
+
+    def close(self) -> None:
+        """Unmap the ring, and remove it if this process created it. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        # Drop numpy views before closing the mapping
+        self._header = self._table = self._times = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingFrameSource:
+    """
+    FrameGrabber-compatible reader over a FrameRing, so CameraCaptureThread can run
+    in a different process from the camera.
+    """
+    def __init__(self, ring: FrameRing, poll_interval: float = 0.002):
+        self.ring = ring
+        self.poll_interval = poll_interval
+        self.read_failures = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+    def latest(self):
+        seq = self.ring.write_seq
+        while seq > 0:
+            found = self.ring.read(seq)
+            if found is not None:
+                return seq, found[0], found[1]
+            seq = self.ring.write_seq
+        return 0, None, None
+
+    def wait_for_frame(self, after_seq: int, timeout: float = 1.0):
+        deadline = time.monotonic() + timeout
+        while self.ring.write_seq <= after_seq:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(self.poll_interval)
+        return self.latest()
+
+
+def camera_process_main(ring_name: str, stop_event, camera_index: int = 0, mjpeg_passthrough: bool = False,
+                        width: int = None, height: int = None, fps: float = None) -> None:
+    """Camera process: read frames as fast as the camera delivers them and publish to the ring."""
+    ring = FrameRing(ring_name)
+    cap = open_camera(camera_index, mjpeg_passthrough=mjpeg_passthrough, width=width, height=height, fps=fps)
+    print("[CameraProcess] Publishing frames to shared memory.")
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.1)
+            elif ring.publish(frame) is None and ring.oversized == 1:
+                print(f"[CameraProcess] Frame of {frame.nbytes} bytes exceeds ring slot size {ring.slot_size}, "
+                      "skipping oversized frames.")
+    finally:
+        if ring.oversized:
+            print(f"[CameraProcess] Skipped {ring.oversized} oversized frames.")
+        cap.release()
+        ring.close()
+
+
+def capture_process_main(ring_name: str, stop_event, bursts, capture_kwargs: dict) -> None:
+    """Capture process: run CameraCaptureThread (scoring, dedupe, writing) on frames from the ring."""
+    ring = FrameRing(ring_name)
+    capture = CameraCaptureThread(frame_source=RingFrameSource(ring), **capture_kwargs)
+    capture.start()
+    try:
+        while not stop_event.is_set():
+            try:
+                site_id, position = bursts.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            capture.trigger_burst(site_id, position)
+    finally:
+        capture.stop()
+        capture.join()
+        capture.release()
+        ring.close()
+
+
+class CameraProcesses:
+    """
+    Runs the camera and the capture/writer pipeline in their own processes, joined by a
+    FrameRing, so image work never competes with the control loop for the GIL.
+    Offers the same start/trigger_burst/stop/join/release calls as CameraCaptureThread.
+    Slots default to one decoded BGR frame at the requested resolution (720p if none),
+    which also holds any passthrough JPEG of that resolution.
+    """
+    def __init__(self, camera_index=0, mjpeg_passthrough=False, width=None, height=None, fps=None,
+                 ring_slots=8, slot_size=None, position_source=None, **capture_kwargs):
+        slot_size = slot_size or (width or 1280) * (height or 720) * 3
+        self.ring = FrameRing(slots=ring_slots, slot_size=slot_size, create=True)
+        self.position_source = position_source
+        self._stop_event = mp.Event()
+        self._bursts = mp.Queue()
+        camera_args = dict(camera_index=camera_index, mjpeg_passthrough=mjpeg_passthrough,
+                           width=width, height=height, fps=fps)
+        self.camera_process = mp.Process(target=camera_process_main, daemon=True,
+                                         args=(self.ring.name, self._stop_event), kwargs=camera_args)
+        self.capture_process = mp.Process(target=capture_process_main, daemon=True,
+                                          args=(self.ring.name, self._stop_event, self._bursts, capture_kwargs))
+
+    def start(self):
+        self.camera_process.start()
+        self.capture_process.start()
+
+    def trigger_burst(self, site_id):
+        position = self.position_source() if self.position_source else None
+        self._bursts.put((site_id, position))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def join(self, timeout=10):
+        self.camera_process.join(timeout)
+        self.capture_process.join(timeout)
+
+    def release(self):
+        # Called from the main loop's cleanup and again by atexit
+        if self.ring.closed:
+            return
+        self.ring.close()
+        print("[CameraProcesses] Released shared frame ring.")
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class ImageStore:
+    """
+    Collision-free image store.
+    Images get monotonic sub-second IDs, are sharded into <date>/<site>/ folders,
+    are written atomically (temp file then rename) and are listed in an
+    append-only JSONL manifest so readers never need to scan the tree.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._last_us = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def new_id(self) -> str:
+        """Return a unique, strictly increasing ID such as 20250420-095004-910123."""
+        with self._lock:
+            now_us = time.time_ns() // 1000
+            if now_us <= self._last_us:
+                now_us = self._last_us + 1
+            self._last_us = now_us
+        seconds, micros = divmod(now_us, 1_000_000)
+        return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(seconds))}-{micros:06d}"
+
+    @staticmethod
+    def shard_for(captured_at: float, site_id=None) -> str:
+        """Relative shard directory for a capture, e.g. 2025-04-20/site0003."""
+        day = time.strftime("%Y-%m-%d", time.localtime(captured_at))
+        site = f"site{site_id:04d}" if site_id is not None else "interval"
+        return f"{day}/{site}"
+
+    def write(self, data: bytes, captured_at: float = None, site_id=None,
+              latitude: float = None, longitude: float = None, dhash: int = None, **extra) -> dict:
+        """
+        Atomically store JPEG bytes and append their manifest record.
+        Extra keyword arguments (e.g. focus score, tags) are stored in the record.
+        """
+        captured_at = captured_at or time.time()
+        image_id = self.new_id()
+        rel_path = f"{self.shard_for(captured_at, site_id)}/{image_id}.jpg"
+        write_atomic(os.path.join(self.root, rel_path), data)
+
+        record = {
+            "id": image_id,
+            "path": rel_path,
+            "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(captured_at))
+                           + f".{int((captured_at % 1) * 1000):03d}",
+            "latitude": latitude,
+            "longitude": longitude,
+            "size": len(data),
+            "sha1": hashlib.sha1(data).hexdigest(),
+            "dhash": f"{dhash:016x}" if dhash is not None else None,
+            "site": site_id,
+        }
+        record.update(extra)
+        self.append_manifest(record)
+        return record
+
+    def append_manifest(self, record: dict) -> None:
+        """Append one record as a JSON line."""
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.manifest_path, "a") as manifest:
+                manifest.write(line)
+                manifest.flush()
+
+    def records(self):
+        """Iterate over manifest records."""
+        return read_manifest(self.root)
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write data to path via a temp file and rename, so readers never see partial files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest(root: str):
+    """Yield manifest records under root, skipping a torn final line after a power cut."""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r") as manifest:
+            for line in manifest:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+class StagedImageStore:
+    """
+    Two-tier image store: frames land in a bounded local staging area (tmpfs or SD card)
+    and a background flusher moves them to the USB drive in sequential batches.
+    Capture never touches the USB drive, so spin-up stalls and an unplugged drive
+    only delay flushing. If staging fills up, the oldest interval frames are dropped
+    first and probe-site frames last.
+    """
+    def __init__(self, root: str, staging_root: str, staging_max_bytes: int = 2 * 1024 ** 3,
+                 min_free_bytes: int = 512 * 1024 ** 2, batch_size: int = 32, flush_interval: float = 30.0,
+                 mount_point: str = None):
+        self.root = root
+        self.mount_point = mount_point
+        self.staging = ImageStore(staging_root)
+        self.staging_max_bytes = staging_max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._pending = []
+        self._in_flight = 0
+        self.staged_bytes = 0
+        self.flushed_files = 0
+        self.flushed_bytes = 0
+        self.flush_seconds = 0.0
+        self.dropped = 0
+        self.drive_available = False
+        self._recover()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _recover(self) -> None:
+        """Re-queue frames left in staging by a previous run."""
+        for record in self.staging.records():
+            path = os.path.join(self.staging.root, record["path"])
+            if os.path.exists(path):
+                self._pending.append(record)
+                self.staged_bytes += record.get("size", 0)
+        if self._pending:
+            print(f"[ImageStore] Recovered {len(self._pending)} staged images from a previous run.")
+
+    def write(self, data: bytes, **metadata) -> dict:
+        """Stage JPEG bytes locally; same arguments and record as ImageStore.write()."""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            record = self.staging.write(data, **metadata)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        # Leave in-flight and become pending in one step, so flush() never sees neither while the
+        # record's staging manifest line exists, and truncates it
+        with self._lock:
+            self._in_flight -= 1
+            self._pending.append(record)
+            self.staged_bytes += record["size"]
+            self._enforce_staging_limit()
+            full_batch = len(self._pending) >= self.batch_size
+        if full_batch:
+            self._wake.set()
+        return record
+
+    def _enforce_staging_limit(self) -> None:
+        """Drop staged frames (interval frames first, oldest first) until under the size bound."""
+        while self.staged_bytes > self.staging_max_bytes and self._pending:
+            victim = next((rec for rec in self._pending if rec.get("site") is None), self._pending[0])
+            self._pending.remove(victim)
+            self.staged_bytes -= victim["size"]
+            self.dropped += 1
+            try:
+                os.remove(os.path.join(self.staging.root, victim["path"]))
+            except FileNotFoundError:
+                pass
+            print(f"[ImageStore] Staging full, dropped {victim['id']}.")
+
+    def _drive_ready(self) -> bool:
+        mount_point = self.mount_point or os.path.dirname(self.root)
+        if not os.path.ismount(mount_point):
+            return False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            return shutil.disk_usage(self.root).free > self.min_free_bytes
+        except OSError:
+            return False
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Move pending frames to the USB drive in batches; returns the number moved."""
+        moved = 0
+        while True:
+            ready = self._drive_ready()
+            if ready != self.drive_available:
+                print(f"[ImageStore] USB drive {'available' if ready else 'unavailable or full'}.")
+                self.drive_available = ready
+            with self._lock:
+                batch = self._pending[:self.batch_size]
+            if not ready or not batch:
+                break
+
+            start = time.perf_counter()
+            done, gone, batch_bytes = [], [], 0
+            for record in batch:
+                src = os.path.join(self.staging.root, record["path"])
+                try:
+                    with open(src, "rb") as staged:
+                        data = staged.read()
+                except FileNotFoundError:
+                    gone.append(record)
+                    continue
+                try:
+                    write_atomic(os.path.join(self.root, record["path"]), data)
+                except OSError as e:
+                    print(f"[ImageStore] Flush to USB drive failed: {e}")
+                    break
+                batch_bytes += len(data)
+                done.append(record)
+            if not done and not gone:
+                break
+
+            if done:
+                with open(self.manifest_path, "a") as manifest:
+                    manifest.write("".join(json.dumps(record) + "\n" for record in done))
+                    manifest.flush()
+                    os.fsync(manifest.fileno())
+            for record in done:
+                try:
+                    os.remove(os.path.join(self.staging.root, record["path"]))
+                except FileNotFoundError:
+                    pass
+
+            with self._lock:
+                for record in done + gone:
+                    if record in self._pending:
+                        self._pending.remove(record)
+                        self.staged_bytes -= record["size"]
+                # Staging is empty: reset its manifest so recovery only sees unflushed frames
+                if not self._pending and not self._in_flight:
+                    open(self.staging.manifest_path, "w").close()
+            self.flushed_files += len(done)
+            self.flushed_bytes += batch_bytes
+            self.flush_seconds += time.perf_counter() - start
+            moved += len(done)
+            if len(done) + len(gone) < len(batch):
+                break
+        return moved
+
+    def stats(self) -> dict:
+        """Staging depth and flush throughput."""
+        with self._lock:
+            return {
+                "staged_files": len(self._pending),
+                "staged_mb": round(self.staged_bytes / 1e6, 1),
+                "flushed_files": self.flushed_files,
+                "flush_mb_per_s": round(self.flushed_bytes / 1e6 / self.flush_seconds, 1) if self.flush_seconds else None,
+                "dropped": self.dropped,
+                "drive_available": self.drive_available,
+            }
+
+    def records(self):
+        return read_manifest(self.root)
+
+    def close(self) -> None:
+        """Stop the flusher after a final flush attempt."""
+        self._stop_event.set()
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
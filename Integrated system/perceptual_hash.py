@@ -0,0 +1,31 @@
+"""
+Difference hash (dHash) for spotting near-identical images.
+
+Used at capture time by camera_pipeline and again on the desktop by the plant
+classifier's "skip near-duplicate images" option, so both compute exactly the same
+hash. Only NumPy is needed: callers decode the image to grayscale themselves (a
+reduced-size decode is plenty) with whatever library they already use.
+"""
+import numpy as np
+
+
+def dhash_gray(gray, hash_size: int = 8) -> int:
+    """
+    hash_size*hash_size-bit hash of a 2-D grayscale array: the image is box-averaged down
+    to hash_size rows of hash_size + 1 columns and each bit says whether a cell is
+    brighter than its left neighbour.
+    """
+    gray = np.asarray(gray, dtype=np.float32)
+    rows = np.linspace(0, gray.shape[0], hash_size + 1).astype(int)
+    cols = np.linspace(0, gray.shape[1], hash_size + 2).astype(int)
+    if (np.diff(rows) == 0).any() or (np.diff(cols) == 0).any():
+        raise ValueError(f"Image of {gray.shape[1]}x{gray.shape[0]} is too small to hash")
+    sums = np.add.reduceat(np.add.reduceat(gray, rows[:-1], axis=0), cols[:-1], axis=1)
+    small = sums / np.outer(np.diff(rows), np.diff(cols))
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
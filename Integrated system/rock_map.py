@@ -0,0 +1,143 @@
+import json
+import math
+import os
+import time
+
+# Metres per degree of latitude (close enough at field scale)
+METRES_PER_DEG = 111320.0
+
+# Default persistence file and search settings
+ROCK_MAP_FILE = "rock_map.json"
+DEFAULT_CELL_SIZE_M = 1.0
+DEFAULT_AVOID_RADIUS_M = 1.5
+
+
+class RockMap:
+    """
+    Uniform-grid spatial index of rock/stone strikes, persisted between missions.
+    Positions are projected onto a local equirectangular plane anchored at ref_lat.
+    """
+    def __init__(self, cell_size_m: float = DEFAULT_CELL_SIZE_M, ref_lat: float = None, path: str = ROCK_MAP_FILE):
+        self.cell_size_m = cell_size_m
+        self.ref_lat = ref_lat
+        self.path = path
+        self.rocks = []
+        self._grid = {}
+
+    # ---------------------
+    # Projection helpers
+    # ---------------------
+    def _to_xy(self, lat: float, lon: float):
+        """Project lat/lon (degrees) to local metres."""
+        if self.ref_lat is None:
+            self.ref_lat = lat
+        x = lon * METRES_PER_DEG * math.cos(math.radians(self.ref_lat))
+        y = lat * METRES_PER_DEG
+        return x, y
+
+    def _from_xy(self, x: float, y: float):
+        """Inverse of _to_xy."""
+        lat = y / METRES_PER_DEG
+        lon = x / (METRES_PER_DEG * math.cos(math.radians(self.ref_lat)))
+        return lat, lon
+
+    def _cell(self, x: float, y: float):
+        return (math.floor(x / self.cell_size_m), math.floor(y / self.cell_size_m))
+
+    def _index(self, rock: dict) -> None:
+        x, y = self._to_xy(rock["latitude"], rock["longitude"])
+        self._grid.setdefault(self._cell(x, y), []).append((x, y, rock))
+
+    # ---------------------
+    # Recording & queries
+    # ---------------------
+    def record(self, lat: float, lon: float, current_mA: float = None) -> dict:
+        """Record a rock strike at lat/lon and return the stored entry."""
+        rock = {
+            "latitude": lat,
+            "longitude": lon,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "current_mA": current_mA,
+        }
+        self.rocks.append(rock)
+        self._index(rock)
+        return rock
+
+    def nearby(self, lat: float, lon: float, radius_m: float = DEFAULT_AVOID_RADIUS_M) -> list:
+        """Return all recorded rocks within radius_m metres of lat/lon."""
+        if not self.rocks:
+            return []
+        x, y = self._to_xy(lat, lon)
+        cx, cy = self._cell(x, y)
+        reach = math.ceil(radius_m / self.cell_size_m)
+        found = []
+        for ix in range(cx - reach, cx + reach + 1):
+            for iy in range(cy - reach, cy + reach + 1):
+                for rx, ry, rock in self._grid.get((ix, iy), ()):
+                    if math.hypot(rx - x, ry - y) <= radius_m:
+                        found.append(rock)
+        return found
+
+    def is_clear(self, lat: float, lon: float, radius_m: float = DEFAULT_AVOID_RADIUS_M) -> bool:
+        """True if no known rock lies within radius_m of lat/lon."""
+        return not self.nearby(lat, lon, radius_m)
+
+    def choose_probe_site(self, lat: float, lon: float, radius_m: float = DEFAULT_AVOID_RADIUS_M,
+                          step_m: float = None, max_rings: int = 3):
+        """
+        Pick a probe point at or near lat/lon that avoids known rocks.
+        Candidates are tried on rings of step_m spacing around the requested point.
+        Returns (lat, lon), or None if every candidate is too close to a rock (skip the site).
+        """
+        if lat is None or lon is None:
+            return lat, lon
+        if self.is_clear(lat, lon, radius_m):
+            return lat, lon
+
+        step_m = step_m or radius_m
+        x, y = self._to_xy(lat, lon)
+        for ring in range(1, max_rings + 1):
+            dist = ring * step_m
+            points = 8 * ring
+            for k in range(points):
+                angle = 2 * math.pi * k / points
+                cand = self._from_xy(x + dist * math.cos(angle), y + dist * math.sin(angle))
+                if self.is_clear(cand[0], cand[1], radius_m):
+                    return cand
+        return None
+
+    # ---------------------
+    # Persistence
+    # ---------------------
+    def save(self, path: str = None) -> None:
+        """Write the map to JSON atomically."""
+        path = path or self.path
+        data = {
+            "cell_size_m": self.cell_size_m,
+            "ref_lat": self.ref_lat,
+            "rocks": self.rocks,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump(data, json_file, indent=4)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = ROCK_MAP_FILE, cell_size_m: float = DEFAULT_CELL_SIZE_M) -> "RockMap":
+        """Load a saved map, or return an empty one if the file is missing or corrupted."""
+        try:
+            with open(path, "r") as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(cell_size_m=cell_size_m, path=path)
+
+        rock_map = cls(cell_size_m=data.get("cell_size_m", cell_size_m), ref_lat=data.get("ref_lat"), path=path)
+        for rock in data.get("rocks", []):
+            if rock.get("latitude") is None or rock.get("longitude") is None:
+                continue
+            rock_map.rocks.append(rock)
+            rock_map._index(rock)
+        return rock_map
+
+    def __len__(self):
+        return len(self.rocks)
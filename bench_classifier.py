@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Throughput and accuracy benchmark for the plant classifier over the bundled Test data.
+
+Every labelled image (see labelled_data.py) is first run stage by stage, in batches of
+Config.BATCH_SIZE on one thread, so the cost of each stage can be attributed:
+  decode    image file -> model input (fast or bioclip path, as configured)
+  exif      EXIF header read for GPS and orientation
+  embed     BioCLIP vision encoder
+  custom    custom-label or linear-probe scoring
+  species   Tree-of-Life species scoring
+  format    ranking, thresholds and the result record
+The pipelined iter_results path (what process_folder and classify_cli run, without the
+results cache) is then timed end to end for images/s; like those, it classifies identical
+images (e.g. the copies in "Website Testing") once.
+
+Accuracy is top-k against the ground-truth label. A custom prediction matches when it
+is the same label (compared with labelled_data.label_key). A species prediction matches
+when the label occurs in the species' common name ("Hawthorn" in "Common Hawthorn").
+Images whose label is not one of the custom labels or probe classes are left out of
+the custom accuracy.
+
+Results are written as JSON with the configuration, git commit and host, so runs can
+be compared:
+
+    python bench_classifier.py --out bench-before.json
+    python bench_classifier.py --out bench-after.json --quantize
+    python bench_classifier.py --compare bench-before.json bench-after.json
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+STAGES = ["decode", "exif", "embed", "custom", "species", "format"]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def species_match(label_key_, prediction):
+    from labelled_data import label_key
+    common = prediction.get("common_name") or ""
+    return bool(common) and label_key_ in label_key(common)
+
+
+def run_benchmark(folders, run_cfg, k_values):
+    import torch
+    from bench_model_load import peak_rss_mb
+    from image_decode import decode_image, to_model_batch
+    from image_index import read_metadata
+    from labelled_data import label_key, labelled_images
+    from plant_classifier_gui import (ClassifierManager, DEFAULT_LABELS, build_result, custom_probabilities,
+                                      embed_image, encode_batch, format_predictions, iter_results,
+                                      use_fast_decode)
+
+    pairs = labelled_images(folders)
+    if not pairs:
+        raise SystemExit("No labelled images found")
+
+    start = time.perf_counter()
+    manager = ClassifierManager(run_cfg, DEFAULT_LABELS)
+    manager.load()
+    load_s = time.perf_counter() - start
+    species = manager.species
+    fast = use_fast_decode(manager, run_cfg)
+    custom_classes = manager.probe.classes if manager.probe else (manager.labels if manager.custom else [])
+    custom_keys = {label_key(label) for label in custom_classes}
+    embed_image(pairs[0][0], manager)  # warm-up
+
+    stage_s = dict.fromkeys(STAGES, 0.0)
+    hits = {stage: dict.fromkeys(k_values, 0) for stage in ("custom", "species")}
+    counted = {"custom": 0, "species": 0}
+    failed = 0
+    for batch_start in range(0, len(pairs), run_cfg.BATCH_SIZE):
+        chunk = pairs[batch_start:batch_start + run_cfg.BATCH_SIZE]
+
+        t0 = time.perf_counter()
+        if fast:
+            decoded = [decode_image(path) for path, _ in chunk]
+        else:
+            decoded = []
+            for path, _ in chunk:
+                try:
+                    decoded.append(species.preprocess(species.ensure_rgb_image(path)))
+                except Exception:
+                    decoded.append(None)
+        rows = [i for i, d in enumerate(decoded) if d is not None]
+        failed += len(chunk) - len(rows)
+        if not rows:
+            continue
+        valid = [decoded[i] for i in rows]
+        batch = to_model_batch(valid) if fast else torch.stack(valid)
+        t1 = time.perf_counter()
+        locations = [read_metadata(chunk[i][0])[0] for i in rows]
+        t2 = time.perf_counter()
+        features = encode_batch(batch, manager)
+        t3 = time.perf_counter()
+        cprobs = custom_probabilities(features, manager)
+        t4 = time.perf_counter()
+        sprobs = species.species_probabilities(features).cpu()
+        t5 = time.perf_counter()
+        predictions = []
+        for row, i in enumerate(rows):
+            path = chunk[i][0]
+            cpreds, spreds = format_predictions(path, cprobs[row] if cprobs is not None else None, sprobs[row],
+                                                manager)
+            build_result(path, [dict(p) for p in cpreds], spreds, run_cfg, locations[row])
+            predictions.append((chunk[i][1], cpreds, spreds))
+        t6 = time.perf_counter()
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            stage_s[stage] += seconds
+
+        for label, cpreds, spreds in predictions:
+            key = label_key(label)
+            if key in custom_keys:
+                counted["custom"] += 1
+                ranked = [label_key(p["classification"]) for p in cpreds]
+                for k in k_values:
+                    hits["custom"][k] += key in ranked[:k]
+            counted["species"] += 1
+            for k in k_values:
+                hits["species"][k] += any(species_match(key, p) for p in spreds[:k])
+
+    timed = len(pairs) - failed
+    start = time.perf_counter()
+    results = list(iter_results([(path, None) for path, _ in pairs], manager, run_cfg, use_cache=False))
+    pipeline_s = time.perf_counter() - start
+    manager.close()
+
+    return {
+        "commit": git_commit(),
+        "host": {"cpus": os.cpu_count(), "platform": platform.platform(), "python": platform.python_version(),
+                 "torch": torch.__version__, "torch_threads": torch.get_num_threads()},
+        "config": dataclasses.asdict(run_cfg),
+        "images": len(pairs),
+        "failed": failed,
+        "load_s": round(load_s, 3),
+        "stage_ms_per_image": {stage: round(1000 * s / timed, 3) for stage, s in stage_s.items()} if timed else {},
+        "staged_images_per_s": round(timed / sum(stage_s.values()), 3) if timed else None,
+        "pipeline_images_per_s": round(len(results) / pipeline_s, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": {stage: {"images": counted[stage],
+                             **{f"top{k}": round(hits[stage][k] / counted[stage], 4) if counted[stage] else None
+                                for k in k_values}}
+                     for stage in hits},
+    }
+
+
+def flatten(record, prefix=""):
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            if key not in ("config", "host"):
+                flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before_path} ({before.get('commit')})   after: {after_path} ({after.get('commit')})")
+    changed = {key: (before["config"].get(key), value) for key, value in after["config"].items()
+               if before["config"].get(key) != value}
+    for key, (old, new) in changed.items():
+        print(f"  config {key}: {old!r} -> {new!r}")
+    old, new = flatten(before), flatten(after)
+    for key in [k for k in new if k in old]:
+        delta = f"{100 * (new[key] - old[key]) / old[key]:+.1f}%" if old[key] else ""
+        print(f"{key:32s} {old[key]:>12} {new[key]:>12} {delta:>9}")
+
+
+def main():
+    from labelled_data import LABELLED_FOLDERS
+    from plant_classifier_gui import cfg
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="*", default=LABELLED_FOLDERS)
+    parser.add_argument("--out", help="Write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two results files")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5], help="k values for top-k accuracy (max 5)")
+    parser.add_argument("--batch-size", type=int, default=cfg.BATCH_SIZE)
+    parser.add_argument("--quantize", action="store_true")
+    parser.add_argument("--no-fast-decode", action="store_true")
+    parser.add_argument("--probe", default=cfg.CUSTOM_PROBE)
+    parser.add_argument("--shortlist", default=cfg.SPECIES_SHORTLIST)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    run_cfg = dataclasses.replace(cfg, BATCH_SIZE=args.batch_size, QUANTIZE=args.quantize,
+                                  FAST_DECODE=not args.no_fast_decode, CUSTOM_PROBE=args.probe,
+                                  SPECIES_SHORTLIST=args.shortlist)
+    result = run_benchmark(args.folders, run_cfg, sorted(set(args.k)))
+    print(f"{result['images']} images ({result['failed']} failed) | load {result['load_s']:.1f} s | "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    print("ms/image  " + "  ".join(f"{stage} {ms:.1f}" for stage, ms in result["stage_ms_per_image"].items()))
+    print(f"staged {result['staged_images_per_s']} images/s | pipeline {result['pipeline_images_per_s']} images/s")
+    for stage, acc in result["accuracy"].items():
+        scores = "  ".join(f"{name} {100 * value:.1f}%" for name, value in acc.items()
+                           if name != "images" and value is not None)
+        print(f"{stage:8s} accuracy over {acc['images']} images: {scores or 'n/a'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Measure classifier throughput (images/s) for batched inference at several batch sizes.
+
+The baseline is the previous process_folder design: one process_image() per file on a
+default ThreadPoolExecutor, each doing a batch-size-1 forward pass. Each batched run
+uses BatchInference with the given batch size, decode workers and torch threads.
+
+    python bench_classifier_batch.py "Test data/Hawthorn" "Test data/Rhodedron" --batch-sizes 1 4 8 16 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from plant_classifier_gui import (BatchInference, ClassifierManager, DEFAULT_LABELS, cfg, list_images,
+                                  process_image)
+
+
+def run_threaded(items, manager):
+    with ThreadPoolExecutor() as executor:
+        return list(executor.map(lambda item: process_image(item[0], manager, cfg, item[1]), items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="+", help="Image folders to classify")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--decode-workers", type=int, default=cfg.DECODE_WORKERS)
+    parser.add_argument("--threads", type=int, default=cfg.TORCH_THREADS, help="torch threads (0 = all cores)")
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the per-image thread pool baseline")
+    args = parser.parse_args()
+
+    items = []
+    for folder in args.folders:
+        image_paths, _ = list_images(folder)
+        items.extend((str(p), None) for p in sorted(image_paths))
+    if not items:
+        print("No images found.")
+        return
+
+    manager = ClassifierManager(cfg, DEFAULT_LABELS)
+    manager.load()
+    # Warm-up so one-off allocations are not charged to the first run
+    list(BatchInference(manager, cfg, batch_size=2, num_threads=args.threads).run(items[:2]))
+    print(f"{len(items)} images, torch threads {torch.get_num_threads()}, decode workers {args.decode_workers}")
+
+    if not args.no_baseline:
+        start = time.perf_counter()
+        run_threaded(items, manager)
+        elapsed = time.perf_counter() - start
+        print(f"per-image threads  {len(items) / elapsed:7.2f} images/s  ({elapsed:.1f} s)")
+
+    for batch_size in args.batch_sizes:
+        engine = BatchInference(manager, cfg, batch_size=batch_size, decode_workers=args.decode_workers,
+                                num_threads=args.threads)
+        start = time.perf_counter()
+        results = list(engine.run(items))
+        elapsed = time.perf_counter() - start
+        failed = sum(res is None for res in results)
+        print(f"batch {batch_size:3d}          {len(items) / elapsed:7.2f} images/s  ({elapsed:.1f} s"
+              f"{f', {failed} failed' if failed else ''})")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
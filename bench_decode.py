@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Compare the bioclip decode path with the fast decode path (image_decode.py).
+
+  bioclip  - PIL full-resolution decode + bioclip's ToTensor/Resize/Normalize transforms
+  fast     - JPEG draft-mode reduced decode + EXIF orientation + 224x224 resize, normalised per batch
+  fast xN  - the fast path across N worker processes, as BatchInference runs it
+
+Reports milliseconds per image for each, and the mean absolute difference between the
+two model inputs (in normalised units) as a check that the fast path feeds the model
+the same picture. Images with an EXIF rotation are counted separately: the bioclip path
+ignores the tag, so the model used to see them sideways.
+
+    python bench_decode.py
+    python bench_decode.py "Test data/Hawthorn" --workers 4 --repeat 3
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from bioclip.predict import preprocess_img
+from PIL import Image
+
+from image_decode import decode_image, to_model_batch
+from plant_classifier_gui import list_images
+
+ORIENTATION_TAG = 0x0112
+DEFAULT_FOLDERS = ["Test data/Hawthorn", "Test data/Rhodedron", "Test data/Bio Clip testing"]
+
+
+def bioclip_decode(path):
+    with Image.open(path) as img:
+        return preprocess_img(img.convert("RGB"))
+
+
+def fast_decode(path):
+    return to_model_batch([decode_image(path)])[0]
+
+
+def time_per_image(fn, paths, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            fn(path)
+    return 1000 * (time.perf_counter() - start) / (repeat * len(paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="*", default=DEFAULT_FOLDERS)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for the pooled run")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    torch.set_num_threads(1)
+
+    paths = []
+    for folder in args.folders:
+        image_paths, _ = list_images(folder)
+        paths.extend(sorted(str(p) for p in image_paths))
+    if not paths:
+        print("No images found")
+        return
+    with Image.open(paths[0]) as img:
+        print(f"{len(paths)} images, first is {img.size[0]}x{img.size[1]} {img.format}")
+
+    slow_ms = time_per_image(bioclip_decode, paths, args.repeat)
+    fast_ms = time_per_image(fast_decode, paths, args.repeat)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(decode_image, paths[:args.workers]))  # start the workers
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            to_model_batch(list(pool.map(decode_image, paths)))
+        pooled_ms = 1000 * (time.perf_counter() - start) / (args.repeat * len(paths))
+
+    diffs, rotated = [], 0
+    for path in paths:
+        with Image.open(path) as img:
+            if img.getexif().get(ORIENTATION_TAG, 1) != 1:
+                rotated += 1
+                continue
+        diffs.append((bioclip_decode(path) - fast_decode(path)).abs().mean().item())
+    print(f"bioclip      {slow_ms:7.1f} ms/image")
+    print(f"fast         {fast_ms:7.1f} ms/image ({slow_ms / fast_ms:.1f}x)")
+    print(f"fast x{args.workers:<2d}     {pooled_ms:7.1f} ms/image wall ({slow_ms / pooled_ms:.1f}x)")
+    if diffs:
+        print(f"input difference on {len(diffs)} upright images: mean {sum(diffs) / len(diffs):.4f}, "
+              f"max {max(diffs):.4f} (normalised units)")
+    print(f"{rotated} images with an EXIF rotation, now decoded upright")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Report classifier load time and resident memory for the old and shared-model load paths.
+
+  old     - what ClassifierManager.load used to do: a throwaway open_clip model and
+            tokenizer, then CustomLabelsClassifier and TreeOfLifeClassifier, each
+            loading its own copy of the model
+  shared  - ClassifierManager.load with one SharedModel for both classifiers
+
+Each path runs in a fresh interpreter so memory figures do not overlap.
+
+    python bench_model_load.py
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def load_old(labels):
+    import open_clip
+    from bioclip import CustomLabelsClassifier, TreeOfLifeClassifier
+    open_clip.create_model_and_transforms('hf-hub:imageomics/bioclip')
+    open_clip.get_tokenizer('hf-hub:imageomics/bioclip')
+    return CustomLabelsClassifier(labels), TreeOfLifeClassifier()
+
+
+def load_shared(labels):
+    from plant_classifier_gui import ClassifierManager, cfg
+    manager = ClassifierManager(cfg, labels)
+    manager.load()
+    return manager
+
+
+def measure(mode):
+    from plant_classifier_gui import DEFAULT_LABELS
+    baseline = rss_mb()
+    start = time.perf_counter()
+    loaded = (load_old if mode == "old" else load_shared)(DEFAULT_LABELS)
+    elapsed = time.perf_counter() - start
+    return {"mode": mode, "load_s": round(elapsed, 2), "rss_mb": round(rss_mb(), 1),
+            "rss_added_mb": round(rss_mb() - baseline, 1), "peak_rss_mb": round(peak_rss_mb(), 1),
+            "loaded": loaded is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["old", "shared"], help="Measure one path in this process")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode)))
+        return
+
+    for mode in ("old", "shared"):
+        out = subprocess.run([sys.executable, __file__, "--mode", mode], capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{mode}: failed\n{out.stderr[-2000:]}")
+            continue
+        stats = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:7s} load {stats['load_s']:6.1f} s | RSS {stats['rss_mb']:7.1f} MB "
+              f"(+{stats['rss_added_mb']:.1f} MB for classifiers) | peak {stats['peak_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Render-time benchmark for the plant map at 1k, 10k and 100k synthetic plants.
+
+Synthetic plants are scattered over a few square kilometres. About a fifth are harmful,
+each has one to five species predictions, and every plant has a thumbnail URL. Two
+renderers are timed for each size:
+  per-marker   a folium.Marker, Icon and Popup per plant, as the app used to build it
+  clustered    plant_map.make_plant_map (FastMarkerCluster layers, popups built on click)
+build is the Python-side map construction and render the generation of the page HTML
+(what st_folium sends to the browser); the page size is reported too. Browser-side
+cost is not measured, but it follows the page size and the number of DOM markers,
+which for the clustered map is the number of visible clusters.
+
+The per-marker map takes minutes at 100k plants, so it is skipped above --legacy-max.
+
+    python bench_plant_map.py
+    python bench_plant_map.py --sizes 1000 10000 --legacy-max 10000 --out plant-map.html
+"""
+import argparse
+import random
+import time
+
+import folium
+
+from plant_map import HARMFUL_TEXT, NONHARMFUL_TEXT, make_plant_map
+
+SPECIES = ["Crataegus monogyna", "Rhododendron ponticum", "Jacobaea vulgaris", "Urtica dioica",
+           "Brassica napus", "Taraxacum officinale", "Rubus fruticosus", "Heracleum mantegazzianum"]
+
+
+# Plant rows in the app's parse_plant_data form, and their bounds
+def synthetic_plants(count, seed=0):
+    rng = random.Random(seed)
+    harmful, nonharmful = [], []
+    for i in range(count):
+        species = sorted(((rng.choice(SPECIES), rng.random()) for _ in range(rng.randint(1, 5))),
+                         key=lambda p: -p[1])
+        plant = {"lat": 52.2 + rng.uniform(-0.02, 0.02), "lon": -1.5 + rng.uniform(-0.03, 0.03),
+                 "image_path": f"images/plant_{i:06d}.jpg", "species": species,
+                 "custom": [("Ragwort", rng.random())]}
+        (harmful if rng.random() < 0.2 else nonharmful).append(plant)
+    return harmful, nonharmful, [[52.18, -1.53], [52.22, -1.47]]
+
+
+# The previous renderer: a Marker, Icon and Popup per plant
+def per_marker_map(harmful, nonharmful, bounds, min_confidence, thumbnails):
+    plant_map = folium.Map()
+    for plants, color, icon, status in ((harmful, "red", "exclamation-triangle", HARMFUL_TEXT),
+                                        (nonharmful, "green", "leaf", NONHARMFUL_TEXT)):
+        for plant in plants:
+            preds = [(name, conf) for name, conf in plant["species"] if conf >= min_confidence]
+            if not preds:
+                continue
+            img_html = f'<img src="{thumbnails[plant["image_path"]]}" loading="lazy" width="150" height="150"><br>'
+            species_list = ", ".join(f"{name} ({conf:.2f})" for name, conf in preds)
+            custom_list = ", ".join(f"{label} ({conf:.2f})" for label, conf in plant["custom"])
+            popup_html = (f"{img_html}<b>Species:</b> {species_list}<br>"
+                          f"<b>Classifications:</b> {custom_list}<br>{status}")
+            folium.Marker(location=[plant["lat"], plant["lon"]], popup=folium.Popup(popup_html, max_width=400),
+                          icon=folium.Icon(color=color, icon=icon, prefix="fa")).add_to(plant_map)
+    plant_map.fit_bounds(bounds)
+    return plant_map
+
+
+def time_renderer(build, *args):
+    start = time.perf_counter()
+    plant_map = build(*args)
+    built = time.perf_counter()
+    html = plant_map.get_root().render()
+    return built - start, time.perf_counter() - built, len(html.encode("utf-8")), plant_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="Largest size to run the per-marker map at")
+    parser.add_argument("--min-confidence", type=float, default=0.0)
+    parser.add_argument("--out", help="Save the largest clustered map here, to open in a browser")
+    args = parser.parse_args()
+
+    renderers = {"per-marker": per_marker_map, "clustered": make_plant_map}
+    print(f"{'plants':>8s}  {'renderer':10s} {'build s':>8s} {'render s':>9s} {'total s':>8s} {'page MB':>8s}")
+    largest = None
+    for count in args.sizes:
+        harmful, nonharmful, bounds = synthetic_plants(count)
+        thumbnails = {p["image_path"]: f"/app/static/thumbnails/{i:040x}.jpg"
+                      for i, p in enumerate(harmful + nonharmful)}
+        for name, build in renderers.items():
+            if name == "per-marker" and count > args.legacy_max:
+                print(f"{count:8d}  {name:10s} {'skipped (--legacy-max)':>36s}")
+                continue
+            build_s, render_s, size, plant_map = time_renderer(build, harmful, nonharmful, bounds,
+                                                               args.min_confidence, thumbnails)
+            print(f"{count:8d}  {name:10s} {build_s:8.2f} {render_s:9.2f} {build_s + render_s:8.2f} "
+                  f"{size / 1e6:8.2f}")
+            if name == "clustered":
+                largest = plant_map
+    if args.out and largest is not None:
+        largest.save(args.out)
+        print(f"Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compare float and dynamic INT8 (Config.QUANTIZE) classification on labelled test images.
+
+Each mode runs in a fresh interpreter and reports load time, resident memory and
+encoder throughput (images/s for encode + scoring, decoding excluded). The INT8
+predictions are then compared with the float ones:
+  top-1 agreement  - INT8 top-1 equals float top-1
+  top-k agreement  - float top-1 appears in the INT8 top-k
+for both the custom labels and the Tree-of-Life species.
+
+    python bench_quantized.py
+    python bench_quantized.py "Test data/Hawthorn" --batch-size 8 --k 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_FOLDERS = ["Test data/Hawthorn", "Test data/Rhodedron", "Test data/Bio Clip testing"]
+
+
+def run_mode(mode, folders, batch_size, k):
+    """Classify every image in one mode; returns stats and per-image top-k labels."""
+    import torch
+    from bench_model_load import peak_rss_mb, rss_mb
+    from plant_classifier_gui import (ClassifierManager, Config, DEFAULT_LABELS, encode_batch,
+                                      format_predictions, list_images, score_features)
+
+    paths = []
+    for folder in folders:
+        image_paths, _ = list_images(folder)
+        paths.extend(sorted(str(p) for p in image_paths))
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    manager = ClassifierManager(Config(QUANTIZE=(mode == "int8")), DEFAULT_LABELS)
+    manager.load()
+    load_s = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    species = manager.species
+    tensors = [species.preprocess(species.ensure_rgb_image(p)) for p in paths]
+    encode_batch(torch.stack(tensors[:1]), manager)  # warm-up
+
+    predictions, model_s = {}, 0.0
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        t0 = time.perf_counter()
+        cprobs, sprobs = score_features(encode_batch(torch.stack(tensors[start:start + batch_size]), manager), manager)
+        model_s += time.perf_counter() - t0
+        for row, path in enumerate(chunk):
+            cpreds, spreds = format_predictions(path, cprobs[row] if cprobs is not None else None, sprobs[row], manager)
+            predictions[path] = {"custom": [p["classification"] for p in cpreds[:k]],
+                                 "species": [p["species"] for p in spreds[:k]]}
+    return {
+        "mode": mode,
+        "images": len(paths),
+        "load_s": round(load_s, 2),
+        "model_rss_mb": round(loaded_rss - baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "images_per_s": round(len(paths) / model_s, 2) if model_s else None,
+        "predictions": predictions,
+    }
+
+
+def agreement(reference, candidate, stage):
+    """(top-1, top-k) agreement of candidate with reference predictions for one stage."""
+    top1 = topk = total = 0
+    for path, ref in reference.items():
+        cand = candidate.get(path)
+        if not cand or not ref[stage] or not cand[stage]:
+            continue
+        total += 1
+        top1 += ref[stage][0] == cand[stage][0]
+        topk += ref[stage][0] in cand[stage]
+    return (top1 / total, topk / total) if total else (None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="*", default=DEFAULT_FOLDERS)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--k", type=int, default=5, help="k for top-k agreement")
+    parser.add_argument("--mode", choices=["float", "int8"], help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with open(args.out, "w") as f:
+            json.dump(run_mode(args.mode, args.folders, args.batch_size, args.k), f)
+        return
+
+    stats = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("float", "int8"):
+            out = os.path.join(tmp, f"{mode}.json")
+            proc = subprocess.run([sys.executable, __file__, *args.folders, "--batch-size", str(args.batch_size),
+                                   "--k", str(args.k), "--mode", mode, "--out", out])
+            if proc.returncode != 0:
+                print(f"{mode} run failed")
+                return
+            with open(out) as f:
+                stats[mode] = json.load(f)
+
+    for mode, s in stats.items():
+        print(f"{mode:6s} {s['images']} images | load {s['load_s']:6.1f} s | model RSS +{s['model_rss_mb']:.0f} MB | "
+              f"peak {s['peak_rss_mb']:.0f} MB | {s['images_per_s']} images/s")
+    speedup = stats["int8"]["images_per_s"] / stats["float"]["images_per_s"]
+    print(f"INT8 speedup {speedup:.2f}x")
+    for stage in ("custom", "species"):
+        top1, topk = agreement(stats["float"]["predictions"], stats["int8"]["predictions"], stage)
+        if top1 is None:
+            continue
+        print(f"{stage:8s} top-1 agreement {100 * top1:5.1f}% | float top-1 in INT8 top-{args.k} {100 * topk:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
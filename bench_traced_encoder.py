@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compare start-up and throughput with and without the traced image encoder (Config.TRACED_ENCODER).
+
+  eager         open_clip's encode_image, as by default
+  traced cold   no artifact yet: the vision tower is traced, frozen and saved during load
+  traced warm   the saved artifact is loaded
+
+Each run is a fresh interpreter and reports ClassifierManager.load() time, the latency of
+the first and second encoder calls on a full batch (graph setup and JIT profiling land
+here), and steady-state images/s over the following batches. The other caches (label
+embeddings, species matrix) are used in every run, so only the encoder differs.
+The cold run deletes existing visual-*.pt artifacts from the cache directory first.
+
+    python bench_traced_encoder.py
+    python bench_traced_encoder.py "Test data/Hawthorn" --batches 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_FOLDERS = ["Test data/Hawthorn", "Test data/Rhodedron", "Test data/Bio Clip testing"]
+MODES = ["eager", "traced-cold", "traced-warm"]
+
+
+def run_mode(mode, folders, batches):
+    import dataclasses
+    from pathlib import Path
+
+    import torch
+    from image_decode import decode_image, to_model_batch
+    from plant_classifier_gui import ClassifierManager, DEFAULT_LABELS, cfg, encode_batch, list_images
+
+    run_cfg = dataclasses.replace(cfg, TRACED_ENCODER=(mode != "eager"))
+    if mode == "traced-cold":
+        for artifact in Path(run_cfg.CACHE_DIR).glob("visual-*.pt"):
+            artifact.unlink()
+
+    paths = []
+    for folder in folders:
+        image_paths, _ = list_images(folder)
+        paths.extend(sorted(str(p) for p in image_paths))
+    arrays = [a for a in (decode_image(p) for p in paths) if a is not None]
+    size = run_cfg.BATCH_SIZE
+    batch = to_model_batch((arrays * (size // len(arrays) + 1))[:size])
+
+    start = time.perf_counter()
+    manager = ClassifierManager(run_cfg, DEFAULT_LABELS)
+    manager.load()
+    load_s = time.perf_counter() - start
+
+    calls = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        first = encode_batch(batch, manager)
+        calls.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for _ in range(batches):
+        encode_batch(batch, manager)
+    steady_s = time.perf_counter() - t0
+    return {
+        "mode": mode,
+        "load_s": round(load_s, 2),
+        "first_call_s": round(calls[0], 2),
+        "second_call_s": round(calls[1], 2),
+        "images_per_s": round(batches * size / steady_s, 2),
+        "features": first[:4].tolist(),
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="*", default=DEFAULT_FOLDERS)
+    parser.add_argument("--batches", type=int, default=4, help="Batches timed for steady state")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with open(args.out, "w") as f:
+            json.dump(run_mode(args.mode, args.folders, args.batches), f)
+        return
+
+    stats = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            out = os.path.join(tmp, f"{mode}.json")
+            proc = subprocess.run([sys.executable, __file__, *args.folders, "--batches", str(args.batches),
+                                   "--mode", mode, "--out", out])
+            if proc.returncode != 0:
+                print(f"{mode} run failed")
+                return
+            with open(out) as f:
+                stats[mode] = json.load(f)
+
+    for mode, s in stats.items():
+        print(f"{mode:12s} load {s['load_s']:6.1f} s | first call {s['first_call_s']:5.2f} s | "
+              f"second call {s['second_call_s']:5.2f} s | steady {s['images_per_s']} images/s")
+    import numpy as np
+    eager = np.array(stats["eager"]["features"])
+    for mode in MODES[1:]:
+        diff = np.abs(np.array(stats[mode]["features"]) - eager).max()
+        print(f"{mode} max feature difference from eager: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+One BioCLIP model instance shared by every classifier in the session.
+
+CustomLabelsClassifier and TreeOfLifeClassifier each load their own copy of the same
+model in BaseClassifier.load_pretrained_model(). Classifiers that mix in
+SharedModelMixin take the model and preprocessing transform from a SharedModel instead,
+which loads on first use and keeps the model alive for later reloads (e.g. after the
+label list is edited).
+
+traced_visual_encoder() adds an optional ahead-of-time TorchScript export of the vision
+tower, saved next to the embedding caches and loaded on later runs.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import open_clip
+import torch
+from torch.ao.quantization import quantize_dynamic
+from bioclip.predict import BIOCLIP_MODEL_STR, TOL_MODELS, preprocess_img
+
+log = logging.getLogger(__name__)
+
+
+class SharedModel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self.load_seconds = 0.0
+
+    # (model, preprocess, pretrained_str) for model_str on device, loading it on first use.
+    # quantize=True gives a dynamic INT8 model (CPU only); the float model is only kept
+    # alongside it if it was already loaded.
+    def get(self, model_str=BIOCLIP_MODEL_STR, pretrained_str=None, device="cpu", quantize=False):
+        model_str = model_str or BIOCLIP_MODEL_STR
+        key = (model_str, pretrained_str, str(device), "int8" if quantize else "float")
+        with self._lock:
+            if key not in self._loaded:
+                float_key = key[:3] + ("float",)
+                if not quantize:
+                    self._loaded[key] = self._load(model_str, pretrained_str, device)
+                elif float_key in self._loaded:
+                    model, preprocess, resolved = self._loaded[float_key]
+                    self._loaded[key] = (quantize_linear_layers(model, inplace=False), preprocess, resolved)
+                else:
+                    model, preprocess, resolved = self._load(model_str, pretrained_str, device)
+                    self._loaded[key] = (quantize_linear_layers(model, inplace=True), preprocess, resolved)
+            return self._loaded[key]
+
+    # Same model resolution as BaseClassifier.load_pretrained_model, without torch.compile:
+    # the classifiers call encode_image/encode_text, which compile() does not accelerate.
+    def _load(self, model_str, pretrained_str, device):
+        start = time.perf_counter()
+        tags = open_clip.list_pretrained_tags_by_model(model_str)
+        if pretrained_str is None and len(tags) > 0:
+            if len(tags) > 1:
+                raise ValueError(f"Multiple pretrained tags available {tags}, must provide one")
+            pretrained_str = tags[0]
+        model, preprocess = open_clip.create_model_from_pretrained(model_str, pretrained=pretrained_str,
+                                                                   device=device, return_transform=True)
+        model.eval()
+        if model_str in TOL_MODELS:
+            preprocess = preprocess_img
+        elapsed = time.perf_counter() - start
+        self.load_seconds += elapsed
+        log.info(f"Loaded {model_str} in {elapsed:.1f} s")
+        return model, preprocess, pretrained_str
+
+
+# Dynamic INT8 quantisation of every nn.Linear (the transformer MLPs in both towers).
+# Weights are stored as int8 and activations are quantised per batch at run time.
+# Attention projections inside nn.MultiheadAttention are left in float by PyTorch.
+def quantize_linear_layers(model, inplace=False):
+    start = time.perf_counter()
+    if torch.backends.quantized.engine == "none":
+        torch.backends.quantized.engine = torch.backends.quantized.supported_engines[-1]
+    float_dtype = next(model.parameters()).dtype
+    quantized = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace)
+    # open_clip takes its cast dtype from mlp.c_fc.weight.dtype unless this attribute is set
+    for module in quantized.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            module.int8_original_dtype = float_dtype
+    quantized.eval()
+    log.info(f"Quantised linear layers to INT8 in {time.perf_counter() - start:.1f} s")
+    return quantized
+
+
+# Frozen TorchScript trace of model.visual, exported to path on first use (traced with
+# [batch_size, 3, image_size, image_size] inputs) and loaded from it on later runs.
+# Calling it on a batch gives the same features as model.encode_image(batch).
+def traced_visual_encoder(model, path, batch_size=16, image_size=224):
+    path = Path(path)
+    device = next(model.parameters()).device
+    start = time.perf_counter()
+    if path.exists():
+        try:
+            encoder = torch.jit.load(str(path), map_location=device)
+            log.info(f"Loaded traced image encoder {path.name} in {time.perf_counter() - start:.1f} s")
+            return encoder
+        except RuntimeError as e:
+            log.warning(f"Cannot load {path} ({e}); exporting it again")
+    example = torch.zeros(batch_size, 3, image_size, image_size, device=device)
+    with torch.no_grad():
+        encoder = torch.jit.freeze(torch.jit.trace(model.visual.eval(), example, check_trace=False))
+    tmp_path = Path(str(path) + ".tmp")
+    torch.jit.save(encoder, str(tmp_path))
+    os.replace(tmp_path, path)
+    log.info(f"Exported traced image encoder to {path} in {time.perf_counter() - start:.1f} s")
+    return encoder
+
+
+# Session-wide instance used by ClassifierManager
+shared_model = SharedModel()
+
+
+# Mix in before a bioclip classifier class to take its model from a SharedModel
+class SharedModelMixin:
+    shared_model = None
+    quantize = False
+
+    def load_pretrained_model(self, model_str=BIOCLIP_MODEL_STR, pretrained_str=None):
+        if self.shared_model is None:
+            return super().load_pretrained_model(model_str=model_str, pretrained_str=pretrained_str)
+        self.model_str = model_str or BIOCLIP_MODEL_STR
+        self.model, self.preprocess, self.pretrained_str = self.shared_model.get(
+            self.model_str, pretrained_str, self.device, quantize=self.quantize)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Headless plant classifier.
+
+Each result is appended to a JSONL file as soon as it is ready, and that file is also
+the checkpoint: re-running with the same --out skips images it already lists, so an
+interrupted run resumes where it stopped. Results are never all held in memory, so
+folders of 100k+ images are fine. At the end the JSONL is streamed into the
+{"plant_data": [...]} document the visualisation app loads.
+
+With --watch, the classifier follows the rover's capture directory instead: images are
+classified in small batches minutes after they are written, each batch is appended to
+the JSONL, and harmful detections are logged immediately. The export is rewritten every
+--export-interval seconds and on exit, rather than per batch, since it re-reads the
+whole JSONL.
+
+    python classify_cli.py "Test data/Hawthorn" "Test data/Rhodedron" --out results.jsonl --export plant_data.json
+    python classify_cli.py /media/soil/USB/images --watch --out mission.jsonl --export plant_data.json
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from folder_watch import ManifestIndex, watch_folder
+from plant_classifier_gui import (ClassifierManager, DEFAULT_LABELS, cfg, folder_items, iter_results,
+                                  manifest_location)
+
+log = logging.getLogger("classify_cli")
+
+
+def read_jsonl(path):
+    """Yield records from a JSONL file, skipping a torn final line from an interrupted run."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+class JsonlWriter:
+    """Append-only JSONL output, flushed per record and fsynced every few records."""
+    def __init__(self, path, fsync_every=64):
+        self.file = open(path, "a", encoding="utf-8")
+        self.fsync_every = fsync_every
+        self._unsynced = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            os.fsync(self.file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def export_plant_data(jsonl_path, out_path):
+    """Stream JSONL results into a {"plant_data": [...]} JSON document; returns the record count."""
+    count = 0
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write('{"plant_data": [\n')
+        for record in read_jsonl(jsonl_path):
+            if count:
+                out.write(",\n")
+            out.write(json.dumps(record, ensure_ascii=False))
+            count += 1
+        out.write("\n]}\n")
+    os.replace(tmp_path, out_path)
+    return count
+
+
+def is_harmful(result):
+    return any(p.get("plant_status") == "harmful" for p in result.get("custom_predictions", []))
+
+
+def run_watch(args, run_cfg, manager, done):
+    """Classify images as they land under the watched folder until interrupted."""
+    root = args.folders[0]
+    paths = queue.Queue(maxsize=args.queue_size)
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch_folder, args=(root, paths, stop), daemon=True,
+                               kwargs=dict(settle=args.settle, poll_interval=args.poll_interval,
+                                           use_inotify=not args.poll, skip=done))
+    watcher.start()
+    manifest = ManifestIndex(root)
+    held = {}  # path -> when it was first ready without a manifest record
+    writer = JsonlWriter(args.out, fsync_every=1)
+    classified = exported = 0
+    last_export = time.monotonic()
+    try:
+        while True:
+            try:
+                batch = [paths.get(timeout=1.0)]
+            except queue.Empty:
+                batch = []
+            # Gather a batch, but do not hold images back for long when captures are sparse
+            deadline = time.monotonic() + args.max_wait
+            while batch and len(batch) < run_cfg.BATCH_SIZE and time.monotonic() < deadline:
+                try:
+                    batch.append(paths.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            # The rover writes a flush's images before their manifest lines, so an image can settle
+            # before its record exists: hold it and look again until --manifest-wait has passed
+            items = []
+            for path in list(held) + batch:
+                record = manifest.lookup(path)
+                waited = time.monotonic() - held.setdefault(path, time.monotonic())
+                if record is None and manifest.exists() and waited < args.manifest_wait:
+                    continue
+                del held[path]
+                items.append((path, manifest_location(record)))
+            if not items:
+                continue
+            for res in iter_results(items, manager, run_cfg, use_cache=not args.no_cache):
+                if not res:
+                    continue
+                writer.write(res)
+                classified += 1
+                if is_harmful(res):
+                    top = res["custom_predictions"][0]
+                    log.warning(f"Harmful plant: {top['classification']} ({top['confidence']}) in "
+                                f"{res['image_path']} at {res['latitude']}, {res['longitude']}")
+            if args.export and time.monotonic() - last_export >= args.export_interval:
+                exported = export_plant_data(args.out, args.export)
+                last_export = time.monotonic()
+            log.info(f"{classified} images classified, {paths.qsize() + len(held)} waiting")
+    except KeyboardInterrupt:
+        log.info("Stopping watch")
+    finally:
+        stop.set()
+        writer.close()
+        watcher.join(timeout=5)
+        if args.export:
+            exported = export_plant_data(args.out, args.export)
+            log.info(f"Exported {exported} results to {args.export}")
+    return 0
+
+
+def load_labels(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="+", help="Image folders to classify")
+    parser.add_argument("--out", required=True, help="JSONL results file (appended to and used to resume)")
+    parser.add_argument("--export", help="Write the {\"plant_data\": [...]} JSON document here at the end")
+    parser.add_argument("--labels", help="Text file of custom labels, one per line (default: built-in labels)")
+    parser.add_argument("--restart", action="store_true", help="Discard existing results instead of resuming")
+    parser.add_argument("--dedupe", action="store_true", help="Skip near-duplicate images")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the results cache")
+    parser.add_argument("--batch-size", type=int, default=cfg.BATCH_SIZE)
+    parser.add_argument("--quantize", action="store_true", help="Use the dynamic INT8 model")
+    parser.add_argument("--shortlist", default=cfg.SPECIES_SHORTLIST,
+                        help="Score only the species in this shortlist CSV, e.g. species_shortlist_uk.csv "
+                             "(default: all species)")
+    parser.add_argument("--probe", default=cfg.CUSTOM_PROBE,
+                        help="Linear-probe head (linear_probe.py) to use instead of the custom labels")
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true", help="Follow new images in the (single) folder")
+    watch.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    watch.add_argument("--poll-interval", type=float, default=2.0)
+    watch.add_argument("--settle", type=float, default=2.0, help="Seconds a file must be unchanged before use")
+    watch.add_argument("--max-wait", type=float, default=5.0, help="Longest wait to fill a batch, in seconds")
+    watch.add_argument("--queue-size", type=int, default=64, help="Ready images buffered before intake blocks")
+    watch.add_argument("--manifest-wait", type=float, default=30.0,
+                       help="Longest wait for an image's manifest record (its location), in seconds")
+    watch.add_argument("--export-interval", type=float, default=300.0,
+                       help="Seconds between refreshes of the --export document")
+    args = parser.parse_args()
+    if args.watch and len(args.folders) != 1:
+        parser.error("--watch takes exactly one folder")
+    if args.watch and args.dedupe:
+        parser.error("--dedupe is not supported with --watch (the rover already drops near-duplicates at capture)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    run_cfg = dataclasses.replace(cfg, BATCH_SIZE=args.batch_size, QUANTIZE=args.quantize,
+                                  SPECIES_SHORTLIST=args.shortlist, CUSTOM_PROBE=args.probe)
+    labels = load_labels(args.labels) if args.labels else DEFAULT_LABELS.copy()
+
+    if args.restart and os.path.exists(args.out):
+        os.remove(args.out)
+    done = {record.get("image_path") for record in read_jsonl(args.out)}
+    if args.watch:
+        manager = ClassifierManager(run_cfg, labels)
+        manager.load()
+        try:
+            return run_watch(args, run_cfg, manager, done)
+        finally:
+            manager.close()
+
+    items = []
+    for folder in args.folders:
+        items.extend(item for item in folder_items(folder, run_cfg, args.dedupe) if item[0] not in done)
+    log.info(f"{len(items)} images to classify, {len(done)} already in {args.out}")
+
+    if items:
+        manager = ClassifierManager(run_cfg, labels)
+        manager.load()
+        writer = JsonlWriter(args.out)
+        start = time.perf_counter()
+        failed = 0
+        try:
+            for idx, res in enumerate(iter_results(items, manager, run_cfg, use_cache=not args.no_cache), start=1):
+                if res:
+                    writer.write(res)
+                else:
+                    failed += 1
+                if idx % 100 == 0 or idx == len(items):
+                    rate = idx / (time.perf_counter() - start)
+                    log.info(f"{idx}/{len(items)} images ({rate:.1f} images/s, {failed} failed)")
+        except KeyboardInterrupt:
+            log.warning("Interrupted; re-run the same command to resume")
+            return 130
+        finally:
+            writer.close()
+            manager.close()
+
+    if args.export:
+        count = export_plant_data(args.out, args.export)
+        log.info(f"Exported {count} results to {args.export}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
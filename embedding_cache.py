@@ -0,0 +1,147 @@
+"""
+On-disk cache of BioCLIP embedding matrices.
+
+Custom-label embeddings are stored one row per label, per model, so reloading with the
+same or a slightly edited label list only encodes labels that have not been seen before.
+Image embeddings (used to train the linear-probe head) are kept the same way, one row
+per image content hash. Tree-of-Life species embeddings are memory-mapped instead of
+read into RAM.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+from bioclip import CustomLabelsClassifier, TreeOfLifeClassifier
+from bioclip.predict import OPENA_AI_IMAGENET_TEMPLATE
+
+from bioclip_model import SharedModelMixin
+
+SPECIES_EMBEDDINGS_FILE = "embeddings/txt_emb_species.npy"
+
+log = logging.getLogger(__name__)
+
+
+# Hash of the model, its INT8 variant and prompt templates; any change invalidates cached label embeddings
+def model_key(model_str, pretrained_str=None, quantize=False):
+    templates = [template("{}") for template in OPENA_AI_IMAGENET_TEMPLATE]
+    text = json.dumps([model_str, pretrained_str, templates] + (["int8"] if quantize else []))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# Write an array to path via a temp file and rename, so readers never see a partial file
+def save_atomic(path, array):
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # [len(ids), dim] rows for ids from cache folder name; encode_fn(missing ids) -> [n, dim] array
+    def _rows(self, name, ids, encode_fn):
+        folder = self.cache_dir / name
+        folder.mkdir(exist_ok=True)
+        matrix_path, index_path = folder / "embeddings.npy", folder / "labels.json"
+
+        cached_ids, rows = [], None
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                cached_ids = json.load(f)
+            rows = np.load(matrix_path, mmap_mode="r")
+            # A crash between replacing the two files leaves one longer than the other; the rows
+            # both cover are still in step, since each save appends to the previous pair
+            count = min(len(cached_ids), len(rows))
+            cached_ids, rows = cached_ids[:count], rows[:count]
+        except (FileNotFoundError, ValueError, json.JSONDecodeError):
+            cached_ids, rows = [], None
+        index = {item: i for i, item in enumerate(cached_ids)}
+
+        missing = list(dict.fromkeys(item for item in ids if item not in index))
+        if missing:
+            log.info(f"Encoding {len(missing)} new {name.split('-')[0]} ({len(ids) - len(missing)} cached)")
+            new_rows = np.asarray(encode_fn(missing), dtype=np.float32)
+            old_rows = np.asarray(rows) if rows is not None else np.empty((0, new_rows.shape[1]), np.float32)
+            all_rows = np.concatenate([old_rows, new_rows])
+            rows = None  # release the memory map before replacing the file
+            save_atomic(matrix_path, all_rows)
+            with open(str(index_path) + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(cached_ids + missing, f)
+            os.replace(str(index_path) + ".tmp", index_path)
+            for item in missing:
+                index[item] = len(index)
+            rows = all_rows
+
+        return np.array(rows[[index[item] for item in ids]], dtype=np.float32)
+
+    # [dim, len(labels)] embedding matrix, encoding only labels missing from the cache
+    def label_embeddings(self, key, labels, encode_fn):
+        rows = self._rows(f"labels-{key}", labels, lambda missing: encode_fn(missing).T.cpu().numpy())
+        return torch.from_numpy(rows.T.copy())
+
+    # [len(hashes), dim] image embeddings by content hash, encoding only images missing from the cache
+    def image_embeddings(self, key, hashes, encode_fn):
+        return self._rows(f"images-{key}", hashes, encode_fn)
+
+    # Memory-mapped species matrix; converted to a float32 copy in the cache if stored otherwise
+    def species_embeddings(self, key, npy_path):
+        array = np.load(npy_path, mmap_mode="c")
+        if array.dtype != np.float32:
+            converted = self.cache_dir / f"species-{key}.npy"
+            if not converted.exists():
+                log.info(f"Converting species embeddings to float32 in {converted}")
+                save_atomic(converted, np.asarray(array, dtype=np.float32))
+            array = np.load(converted, mmap_mode="c")
+        return torch.from_numpy(array)
+
+
+# CustomLabelsClassifier whose label embeddings come from an EmbeddingCache
+class CachedCustomLabelsClassifier(SharedModelMixin, CustomLabelsClassifier):
+    def __init__(self, cls_ary, cache: EmbeddingCache, shared_model=None, quantize=False, **kwargs):
+        self.embedding_cache = cache
+        self.shared_model = shared_model
+        self.quantize = quantize
+        super().__init__(cls_ary, **kwargs)
+
+    def _get_txt_embeddings(self, classnames):
+        key = model_key(self.model_str, self.pretrained_str, self.quantize)
+        encode = super()._get_txt_embeddings
+        return self.embedding_cache.label_embeddings(key, classnames, encode).to(self.device)
+
+
+# TreeOfLifeClassifier that memory-maps the species embedding matrix
+class CachedTreeOfLifeClassifier(SharedModelMixin, TreeOfLifeClassifier):
+    species_index = None  # optional species_shortlist.IVFIndex over the full species set
+    index_nprobe = 16
+    species_key = None    # identifies the shortlist or index in results cache versions
+
+    def __init__(self, cache: EmbeddingCache, shared_model=None, quantize=False, **kwargs):
+        self.embedding_cache = cache
+        self.shared_model = shared_model
+        self.quantize = quantize
+        super().__init__(**kwargs)
+
+    def get_txt_emb(self):
+        path = self.get_cached_datafile(SPECIES_EMBEDDINGS_FILE)
+        return self.embedding_cache.species_embeddings(model_key(self.model_str, self.pretrained_str), path)
+
+    # Restrict scoring to the given species rows, like apply_filter() but with a precomputed submatrix
+    def apply_subset(self, indices, embeddings):
+        self._subset_txt_embeddings = embeddings.to(self.device)
+        self._subset_txt_names = [self.txt_names[i] for i in indices]
+
+    # Species probabilities for normalized image features: exact over the current (sub)set,
+    # or approximate through the IVF index when one is set and no shortlist is applied
+    def species_probabilities(self, features):
+        if self.species_index is not None and self._subset_txt_embeddings is None:
+            return self.species_index.probabilities(features, self.model.logit_scale.exp().item(), self.index_nprobe)
+        return self.create_probabilities(features, self.get_txt_embeddings())
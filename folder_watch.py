@@ -0,0 +1,247 @@
+"""
+Follow new images in a capture directory tree.
+
+InotifyWatcher uses Linux inotify through ctypes (no extra dependency) and adds watches
+for the date/site shard folders the rover creates as it goes; PollingWatcher rescans
+with os.scandir where inotify is unavailable. Both report candidate paths, which a
+Debouncer only releases once their size and mtime have stopped changing, so files still
+being written are never classified. watch_folder() ties them together and feeds ready
+paths into a bounded queue, blocking when the classifier falls behind.
+"""
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import queue
+import select
+import struct
+import time
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+log = logging.getLogger(__name__)
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def scan_images(root):
+    """All image files under root, recursively."""
+    found = []
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_image(entry.name):
+                        found.append(entry.path)
+        except OSError:
+            continue
+    return found
+
+
+class InotifyWatcher:
+    """Reports images closed after writing or renamed into the tree (e.g. atomic temp-file writes)."""
+    def __init__(self, root):
+        self.root = str(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self._dirs = {}
+        self._add_tree(self.root)
+
+    def _add_tree(self, top):
+        """Watch top and every directory below it; returns images already inside."""
+        for dirpath, _, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, dirpath.encode(), WATCH_MASK)
+            if wd < 0:
+                log.warning(f"Cannot watch {dirpath}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._dirs[wd] = dirpath
+        return scan_images(top)
+
+    def read(self, timeout):
+        """Candidate image paths from events within timeout seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(
+                errors="surrogateescape")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                log.warning("inotify queue overflowed; rescanning")
+                paths.extend(scan_images(self.root))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                paths.extend(self._add_tree(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_image(name):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Rescans the tree every interval seconds and reports images that are new or changed."""
+    def __init__(self, root, interval=2.0):
+        self.root = str(root)
+        self.interval = interval
+        self._seen = {}
+        self._next_scan = 0.0
+
+    def read(self, timeout):
+        wait = self._next_scan - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self._next_scan = time.monotonic() + self.interval
+        changed = []
+        for path in scan_images(self.root):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self._seen.get(path) != (st.st_size, st.st_mtime_ns):
+                self._seen[path] = (st.st_size, st.st_mtime_ns)
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class Debouncer:
+    """Releases a path once its size and mtime have been unchanged for settle seconds."""
+    def __init__(self, settle=2.0):
+        self.settle = settle
+        self._pending = {}  # path -> ((size, mtime_ns), time first seen with that signature)
+
+    def add(self, path):
+        self._pending.setdefault(path, (None, time.monotonic()))
+
+    def ready(self):
+        now = time.monotonic()
+        released = []
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]  # removed or renamed away
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif st.st_size > 0 and now - since >= self.settle:
+                released.append(path)
+                del self._pending[path]
+        return released
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def open_watcher(root, poll_interval=2.0, use_inotify=True):
+    """InotifyWatcher where available, otherwise PollingWatcher."""
+    if use_inotify and hasattr(select, "select") and os.name == "posix":
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            log.warning(f"inotify unavailable ({e}); polling every {poll_interval} s")
+    return PollingWatcher(root, poll_interval)
+
+
+def watch_folder(root, out_queue, stop_event, settle=2.0, poll_interval=2.0, use_inotify=True, skip=()):
+    """
+    Put each finished image under root (existing ones first) on out_queue exactly once.
+    Blocks while out_queue is full, so a slow classifier throttles intake rather than
+    growing memory; inotify overflow during a long block is recovered by a rescan.
+    """
+    root = os.path.normpath(root)
+    watcher = open_watcher(root, poll_interval, use_inotify)
+    debouncer = Debouncer(settle)
+    queued = set(skip)
+    for path in scan_images(root):
+        if path not in queued:
+            debouncer.add(path)
+    log.info(f"Watching {root} with {type(watcher).__name__}")
+    try:
+        while not stop_event.is_set():
+            for path in watcher.read(timeout=0.5):
+                if path not in queued:
+                    debouncer.add(path)
+            for path in debouncer.ready():
+                queued.add(path)
+                while not stop_event.is_set():
+                    try:
+                        out_queue.put(path, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+    finally:
+        watcher.close()
+
+
+class ManifestIndex:
+    """Incrementally reads the rover's manifest.jsonl to look up capture records by image path."""
+    def __init__(self, root, manifest_name="manifest.jsonl"):
+        self.root = os.path.normpath(root)
+        self.path = os.path.join(self.root, manifest_name)
+        self._offset = 0
+        self._records = {}
+
+    def _refresh(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                f.seek(self._offset)
+                while True:
+                    line = f.readline()
+                    if not line.endswith("\n"):
+                        break  # incomplete line still being written
+                    self._offset = f.tell()
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("path"):
+                        self._records[os.path.normpath(os.path.join(self.root, record["path"]))] = record
+        except FileNotFoundError:
+            pass
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def lookup(self, image_path):
+        if image_path not in self._records:
+            self._refresh()
+        return self._records.get(image_path)
@@ -0,0 +1,45 @@
+"""
+Fast image decoding for the BioCLIP encoder.
+
+BioCLIP squashes every image to 224x224, so decoding multi-megapixel JPEGs at full
+resolution is wasted work. decode_image() asks libjpeg for a reduced-size decode
+(PIL draft mode scales by 1/2, 1/4 or 1/8 in the DCT domain, never below the target),
+applies the EXIF orientation, resizes to the model input and returns a uint8 HWC
+array. It only uses PIL and NumPy, so it can run in worker processes; the arrays are
+small to send back and are normalised in batches on the main process by to_model_batch().
+torch is imported by to_model_batch() only, so worker processes never load it.
+"""
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# OpenAI CLIP normalisation used by BioCLIP (bioclip.predict.preprocess_img)
+MEAN = (0.48145466, 0.4578275, 0.40821073)
+STD = (0.26862954, 0.26130258, 0.27577711)
+INPUT_SIZE = 224
+
+log = logging.getLogger(__name__)
+
+
+# Decode one image to a [size, size, 3] uint8 array; None if it cannot be read
+def decode_image(image_path, size=INPUT_SIZE):
+    try:
+        with Image.open(image_path) as img:
+            img.draft("RGB", (size, size))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB").resize((size, size), Image.BILINEAR, reducing_gap=3.0)
+            return np.asarray(img, dtype=np.uint8)
+    except Exception as e:
+        log.error(f"Error decoding {image_path}: {e}")
+        return None
+
+
+# Normalised [B, 3, size, size] float tensor from decoded uint8 arrays
+def to_model_batch(arrays):
+    import torch
+
+    batch = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).float().div_(255)
+    mean = torch.tensor(MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(STD).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Metadata index of image folders in SQLite.
+
+One pass, separate from inference, finds images recursively (extensions matched
+case-insensitively) and records for each file its size, mtime, SHA-1 content hash, EXIF
+GPS position and EXIF orientation. Only the JPEG header is read for EXIF: the APP1
+segment is located by walking the markers and parsing stops before the image data.
+Files whose size and mtime are unchanged since the last pass are not opened again, so
+re-runs over a large archive only pay for new images. Files are indexed on a thread
+pool; hashing and file reads release the GIL.
+
+The classifier runs this pass for each chunk of images it is given; it can also be run
+ahead of time, e.g. while a mission's images are still being copied off the rover:
+
+    python image_index.py "Test data/Hawthorn" "Test data/Rhodedron"
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import piexif
+
+from folder_watch import scan_images
+from results_cache import file_sha1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    orientation INTEGER
+);
+"""
+INDEX_DB_NAME = "image_index.sqlite"
+# Command-line defaults: the classifier's index (Config.CACHE_DIR) and Config.INDEX_WORKERS,
+# repeated here so indexing ahead of time does not import torch, tkinter and BioCLIP
+DEFAULT_DB = str(Path.home() / ".cache" / "plant_classifier" / INDEX_DB_NAME)
+DEFAULT_WORKERS = 4
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageRecord:
+    path: str
+    size: int
+    mtime_ns: int
+    sha1: str
+    latitude: float = None
+    longitude: float = None
+    orientation: int = None
+
+    @property
+    def location(self):
+        if self.latitude is None or self.longitude is None:
+            return None
+        return self.latitude, self.longitude
+
+
+# The EXIF APP1 segment of a JPEG (starting b"Exif\0\0"), reading only the header; None if absent
+def read_exif_segment(path):
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            header = f.read(4)
+            if len(header) < 4 or header[0] != 0xFF or header[1] in (0xD9, 0xDA):
+                return None  # end of image, start of scan data or a malformed header
+            length = struct.unpack(">H", header[2:])[0]
+            if header[1] == 0xE1:
+                segment = f.read(length - 2)
+                if segment.startswith(b"Exif\0\0"):
+                    return segment
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+
+
+# Convert EXIF degree/minute/second rationals to decimal degrees. Some editors write a
+# single rational holding decimal degrees instead, which is accepted too.
+def convert_to_degrees(value):
+    if isinstance(value[0], int):
+        return value[0] / value[1]
+    d = value[0][0] / value[0][1]
+    m = value[1][0] / value[1][1]
+    s = value[2][0] / value[2][1]
+    return d + (m / 60.0) + (s / 3600.0)
+
+
+# (latitude, longitude) from a piexif GPS IFD, or None
+def gps_location(gps):
+    lat = gps.get(piexif.GPSIFD.GPSLatitude)
+    lat_ref = gps.get(piexif.GPSIFD.GPSLatitudeRef)
+    lon = gps.get(piexif.GPSIFD.GPSLongitude)
+    lon_ref = gps.get(piexif.GPSIFD.GPSLongitudeRef)
+    if not (lat and lat_ref and lon and lon_ref):
+        return None
+    lat_ref = lat_ref.decode() if isinstance(lat_ref, bytes) else lat_ref
+    lon_ref = lon_ref.decode() if isinstance(lon_ref, bytes) else lon_ref
+    phi = convert_to_degrees(lat)
+    if lat_ref.upper() != 'N': phi = -phi
+    lam = convert_to_degrees(lon)
+    if lon_ref.upper() != 'E': lam = -lam
+    return phi, lam
+
+
+# (location or None, orientation or None) from an image's EXIF header
+def read_metadata(path):
+    try:
+        segment = read_exif_segment(path)
+        if not segment:
+            return None, None
+        exif = piexif.load(segment)
+    except Exception as e:
+        log.error(f"EXIF read error for {path}: {e}")
+        return None, None
+    orientation = exif.get("0th", {}).get(piexif.ImageIFD.Orientation)
+    try:
+        return gps_location(exif.get("GPS", {})), orientation
+    except (TypeError, IndexError, ZeroDivisionError) as e:
+        log.error(f"GPS extraction error for {path}: {e}")
+        return None, orientation
+
+
+# Full ImageRecord for one file
+def index_file(path, st=None):
+    st = st or os.stat(path)
+    location, orientation = read_metadata(path)
+    lat, lon = location or (None, None)
+    return ImageRecord(path, st.st_size, st.st_mtime_ns, file_sha1(path), lat, lon, orientation)
+
+
+class ImageIndex:
+    def __init__(self, db_path, workers=4):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.workers = workers
+
+    def _stored(self, keys):
+        stored = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.db.execute(f"SELECT * FROM images WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            for row in rows:
+                stored[row[0]] = row
+        return stored
+
+    # {path: ImageRecord} for the given paths, (re)indexing new and changed files.
+    # Paths that cannot be read are left out.
+    def update(self, paths):
+        paths = list(paths)
+        keys = [os.path.abspath(p) for p in paths]
+        stored = self._stored(list(set(keys)))
+        records, changed = {}, []
+        for path, key in zip(paths, keys):
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                log.error(f"Cannot index {path}: {e}")
+                continue
+            row = stored.get(key)
+            if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+                records[path] = ImageRecord(path, *row[1:])
+            else:
+                changed.append((path, st))
+        if changed:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [(path, pool.submit(index_file, path, st)) for path, st in changed]
+                for path, fut in futures:
+                    try:
+                        records[path] = rec = fut.result()
+                    except OSError as e:
+                        log.error(f"Cannot index {path}: {e}")
+                        continue
+                    self.db.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (os.path.abspath(path), rec.size, rec.mtime_ns, rec.sha1,
+                                     rec.latitude, rec.longitude, rec.orientation))
+            self.db.commit()
+        return records
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    index = ImageIndex(args.db, args.workers)
+    try:
+        for folder in args.folders:
+            start = time.perf_counter()
+            records = index.update(sorted(scan_images(folder)))
+            located = sum(rec.location is not None for rec in records.values())
+            log.info(f"{folder}: {len(records)} images ({located} with EXIF GPS) in {time.perf_counter() - start:.2f} s")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
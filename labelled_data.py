@@ -0,0 +1,63 @@
+"""
+Ground-truth labels for the bundled test images.
+
+Images are labelled by file name where it names the plant ("Image 10 Ragwort.jpg"),
+otherwise by the nearest folder that does ("Test data/Hawthorn/WIN_....jpg"), looking no
+higher than the labelled folder the image was found under. Misspelt
+folder and file names are mapped through ALIASES so that every image of a plant gets
+the same label.
+"""
+import os
+import re
+
+from folder_watch import scan_images
+
+LABELLED_FOLDERS = ["Test data/Hawthorn", "Test data/Rhodedron", "Test data/Bio Clip testing",
+                    "Test data/Website Testing"]
+
+# Spellings used in the test data -> label
+ALIASES = {
+    "Rhodedron": "Rhododendron",
+    "Rododendron": "Rhododendron",
+    "Rhodedendron": "Rhododendron",
+}
+
+# Folders that group images without naming a plant
+UNLABELLED_FOLDERS = {"cropped", "test data", "bio clip testing", "website testing"}
+
+NAMED_IMAGE = re.compile(r"^Image \d+ (?P<label>.+)$", re.IGNORECASE)
+
+
+# Canonical form for comparing labels across sources ("Oil Seed Rape" == "Oilseed rape")
+def label_key(label):
+    return re.sub(r"[^a-z0-9]", "", label.lower())
+
+
+# Ground-truth label for an image under root, or None if neither the file nor a folder from
+# root down to the image names a plant (folders above root are never used)
+def label_from_path(path, root):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = NAMED_IMAGE.match(stem)
+    if match:
+        label = match.group("label").strip()
+        return ALIASES.get(label, label)
+    root = os.path.normpath(root)
+    rel = os.path.relpath(os.path.dirname(os.path.normpath(path)) or os.curdir, root)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None  # not under root
+    names = [os.path.basename(root)] + ([] if rel == os.curdir else rel.split(os.sep))
+    for name in reversed(names):
+        if name and name not in (os.curdir, os.pardir) and name.lower() not in UNLABELLED_FOLDERS:
+            return ALIASES.get(name, name)
+    return None
+
+
+# Sorted (path, label) pairs for every labelled image under folders
+def labelled_images(folders=LABELLED_FOLDERS):
+    pairs = []
+    for folder in folders:
+        for path in sorted(scan_images(folder)):
+            label = label_from_path(path, folder)
+            if label:
+                pairs.append((path, label))
+    return pairs
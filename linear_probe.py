@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Train a linear-probe head for the custom "harmful weed" stage.
+
+A multinomial logistic regression is fitted on BioCLIP image embeddings of labelled
+images (labels from labelled_data.label_from_path). The embeddings are cached per image
+content, so retraining after adding a few images only encodes the new ones. Features
+are standardised for training and the scaling is folded back into the weights, so
+scoring an embedding is a single [dim, classes] matmul and a softmax.
+
+Cross-validated accuracy is reported next to the zero-shot custom-label accuracy on
+the same images (counting only images whose label is one of the custom labels).
+Identical images that appear in several folders are used once, so they cannot end up
+on both sides of a fold.
+
+Set Config.CUSTOM_PROBE to the saved file to use the head instead of the zero-shot labels.
+
+    python linear_probe.py
+    python linear_probe.py "Test data/Hawthorn" "Test data/Rhodedron" --out probe.npz --folds 5
+"""
+import argparse
+import dataclasses
+import hashlib
+import io
+import json
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+log = logging.getLogger("linear_probe")
+
+PROBE_FILE_NAME = "linear_probe.npz"
+
+
+class LinearProbe:
+    def __init__(self, classes, weight, bias, model_key, key=None):
+        self.classes = list(classes)
+        self.weight = torch.as_tensor(weight, dtype=torch.float32)  # [dim, classes]
+        self.bias = torch.as_tensor(bias, dtype=torch.float32)      # [classes]
+        self.model_key = model_key
+        self.key = key  # content hash of the saved file, for results cache versions
+
+    # [B, classes] probabilities for normalised image embeddings
+    def probabilities(self, features):
+        logits = features.float().cpu() @ self.weight + self.bias
+        return torch.softmax(logits, dim=-1)
+
+    # Predictions for one image, highest first, in the same form as CustomLabelsClassifier.group_probs
+    def ranked(self, key, probs):
+        order = torch.argsort(probs, descending=True)
+        return [{"file_name": key, "classification": self.classes[i], "score": probs[i].item()} for i in order]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, weight=self.weight.numpy(), bias=self.bias.numpy(),
+                     meta=np.array(json.dumps({"classes": self.classes, "model_key": self.model_key})))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        with np.load(io.BytesIO(data)) as npz:
+            meta = json.loads(str(npz["meta"]))
+            return cls(meta["classes"], npz["weight"], npz["bias"], meta["model_key"],
+                       key=hashlib.sha1(data).hexdigest()[:16])
+
+
+# Fit a probe on [N, dim] embeddings; full-batch Adam on standardised features
+def train_probe(embeddings, labels, model_key, epochs=300, lr=0.05, weight_decay=1e-3, seed=0):
+    torch.manual_seed(seed)
+    classes = sorted(set(labels))
+    x = torch.from_numpy(np.asarray(embeddings, dtype=np.float32))
+    y = torch.tensor([classes.index(label) for label in labels])
+    mean, std = x.mean(dim=0), x.std(dim=0, unbiased=False).clamp_min(1e-6)
+    xs = (x - mean) / std
+    linear = torch.nn.Linear(x.shape[1], len(classes))
+    optimizer = torch.optim.Adam(linear.parameters(), lr=lr, weight_decay=weight_decay)
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        loss = torch.nn.functional.cross_entropy(linear(xs), y)
+        loss.backward()
+        optimizer.step()
+    with torch.no_grad():
+        # logits = ((x - mean) / std) @ W.T + b = x @ (W / std).T + (b - (W / std) @ mean)
+        weight = (linear.weight / std).T.contiguous()
+        bias = linear.bias - mean @ weight
+    return LinearProbe(classes, weight, bias, model_key)
+
+
+# Stratified k-fold cross-validation of train_probe: each class's images are shuffled and dealt
+# round-robin over the folds from a random starting fold. Returns a per-image boolean array,
+# True where the held-out prediction was right; a class with a single image is never in the
+# training folds when it is tested, so it always counts as an error.
+def cross_validate(embeddings, labels, model_key, folds=5, seed=0, **train_args):
+    rng = np.random.default_rng(seed)
+    fold_of = np.empty(len(labels), dtype=np.int64)
+    for label in sorted(set(labels)):
+        members = [i for i, l in enumerate(labels) if l == label]
+        rng.shuffle(members)
+        offset = rng.integers(folds)
+        for n, i in enumerate(members):
+            fold_of[i] = (n + offset) % folds
+    correct = np.zeros(len(labels), dtype=bool)
+    for fold in range(folds):
+        train = np.flatnonzero(fold_of != fold)
+        test = np.flatnonzero(fold_of == fold)
+        if not len(test) or not len(train):
+            continue
+        probe = train_probe(embeddings[train], [labels[i] for i in train], model_key, seed=seed, **train_args)
+        probs = probe.probabilities(torch.from_numpy(embeddings[test]))
+        for i, row in zip(test, probs):
+            correct[i] = probe.classes[int(row.argmax())] == labels[i]
+    return correct
+
+
+# Embeddings of the distinct image contents among paths, from the cache where possible.
+# Returns ([N, dim] embeddings, the first path of each content).
+def image_embeddings(paths, manager):
+    from embedding_cache import EmbeddingCache, model_key
+    from image_index import ImageIndex, INDEX_DB_NAME
+    from plant_classifier_gui import embed_image, use_fast_decode
+
+    index = ImageIndex(str(Path(manager.cfg.CACHE_DIR) / INDEX_DB_NAME), manager.cfg.INDEX_WORKERS)
+    try:
+        records = index.update(paths)
+    finally:
+        index.close()
+    path_of = {}
+    for path in paths:
+        if path in records:
+            path_of.setdefault(records[path].sha1, path)
+    hashes = list(path_of)
+    species = manager.species
+    key = model_key(species.model_str, species.pretrained_str, manager.cfg.QUANTIZE)
+    key += "-fast" if use_fast_decode(manager, manager.cfg) else "-bioclip"
+
+    def encode(missing):
+        return np.concatenate([embed_image(path_of[h], manager).cpu().numpy() for h in missing])
+
+    return EmbeddingCache(manager.cfg.CACHE_DIR).image_embeddings(key, hashes, encode), list(path_of.values())
+
+
+def main():
+    from embedding_cache import model_key
+    from labelled_data import LABELLED_FOLDERS, label_key, labelled_images
+    from plant_classifier_gui import ClassifierManager, DEFAULT_LABELS, cfg, classify_embedding
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="*", default=LABELLED_FOLDERS)
+    parser.add_argument("--out", default=str(Path(cfg.CACHE_DIR) / PROBE_FILE_NAME))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--lr", type=float, default=0.05)
+    parser.add_argument("--weight-decay", type=float, default=1e-3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    pairs = labelled_images(args.folders)
+    if not pairs:
+        log.error("No labelled images found")
+        return 1
+    manager = ClassifierManager(dataclasses.replace(cfg, CUSTOM_PROBE=""), DEFAULT_LABELS)
+    manager.load()
+    label_of = dict(pairs)
+    embeddings, paths = image_embeddings([path for path, _ in pairs], manager)
+    labels = [label_of[path] for path in paths]
+    log.info(f"{len(labels)} distinct images, {len(set(labels))} classes")
+
+    key = model_key(manager.species.model_str, manager.species.pretrained_str)
+    train_args = dict(epochs=args.epochs, lr=args.lr, weight_decay=args.weight_decay)
+    correct = cross_validate(embeddings, labels, key, folds=args.folds, **train_args)
+    counts = {label: labels.count(label) for label in set(labels)}
+    repeated = np.array([counts[label] > 1 for label in labels])
+
+    custom_keys = {label_key(label) for label in manager.labels}
+    zero_shot = [(label, classify_embedding(torch.from_numpy(row[None]), "", manager)[0])
+                 for row, label in zip(embeddings, labels) if label_key(label) in custom_keys]
+    zero_shot_correct = sum(bool(preds) and label_key(preds[0]["classification"]) == label_key(label)
+                            for label, preds in zero_shot)
+
+    probe = train_probe(embeddings, labels, key, **train_args)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    probe.save(args.out)
+    print(f"Linear probe: {args.folds}-fold accuracy {100 * correct.mean():.1f}% over {len(labels)} images, "
+          f"{len(probe.classes)} classes")
+    singletons = int((~repeated).sum())
+    if singletons:
+        print(f"  {singletons} classes have a single image and always count as errors")
+        if repeated.any():
+            print(f"  {100 * correct[repeated].mean():.1f}% over the {int(repeated.sum())} images of the "
+                  f"{len(counts) - singletons} classes with more than one image")
+    if zero_shot:
+        print(f"Zero-shot custom labels: top-1 accuracy {100 * zero_shot_correct / len(zero_shot):.1f}% "
+              f"over the {len(zero_shot)} images whose label is a custom label")
+    print(f"Saved to {args.out}; set Config.CUSTOM_PROBE to use it")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
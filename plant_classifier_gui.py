@@ -2,22 +2,44 @@
 """
 Plant Image Classifier Application
 """
+import os
 import json
+import importlib.util
+import queue
 import logging
 import traceback
 import threading
 import subprocess
 import sys
 from pathlib import Path
+from collections import deque
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 
-import piexif
-from tkinter import Tk, Toplevel, Button, Label, Listbox, Entry, END, messagebox, Scrollbar, filedialog
+import numpy as np
+from PIL import Image
+from tkinter import Tk, Toplevel, Button, Label, Listbox, Entry, END, messagebox, Scrollbar, filedialog, BooleanVar, Checkbutton
 from tkinter.ttk import Progressbar, Style
 
-import open_clip
-from bioclip import CustomLabelsClassifier, TreeOfLifeClassifier, Rank
+import torch
+import torch.nn.functional as F
+from bioclip.predict import preprocess_img
+
+from bioclip_model import shared_model, traced_visual_encoder
+from embedding_cache import EmbeddingCache, CachedCustomLabelsClassifier, CachedTreeOfLifeClassifier, model_key
+from image_decode import decode_image, to_model_batch
+from image_index import ImageIndex, INDEX_DB_NAME, read_metadata
+from linear_probe import LinearProbe
+from folder_watch import scan_images
+from results_cache import ResultsCache, results_version
+from species_shortlist import apply_shortlist, load_ivf_index
+
+# The rover's perceptual hash (Integrated system/perceptual_hash.py), loaded by path so desktop
+# deduplication hashes images exactly as capture does without putting the rover code on sys.path
+_spec = importlib.util.spec_from_file_location(
+    "perceptual_hash", Path(__file__).with_name("Integrated system") / "perceptual_hash.py")
+perceptual_hash = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(perceptual_hash)
 
 # ---------------------
 # Configuration & Defaults
@@ -28,9 +50,28 @@ class Config:
     CONF_THRESHOLD_SPECIES: float = 0.10
     HIGH_CONF_CUSTOM: float = 0.80
     HIGH_CONF_SPECIES: float = 0.10
+    CUSTOM_PROBE: str = ""  # linear_probe.py head to use instead of the zero-shot custom labels
+    DEDUPE_MAX_DISTANCE: int = 6
+    BATCH_SIZE: int = 16
+    DECODE_WORKERS: int = 2
+    INDEX_WORKERS: int = 4  # threads hashing and reading EXIF for new files
+    FAST_DECODE: bool = True  # reduced-size JPEG decode + EXIF orientation in worker processes
+    TORCH_THREADS: int = 0  # 0 = one per CPU core
+    CACHE_DIR: str = str(Path.home() / ".cache" / "plant_classifier")
+    QUANTIZE: bool = False  # dynamic INT8 linear layers; faster on CPU, small accuracy change
+    TRACED_ENCODER: bool = False  # TorchScript vision encoder, exported to CACHE_DIR on first use
+    SPECIES_SHORTLIST: str = ""  # family CSV to score only a subset, e.g. species_shortlist_uk.csv; "" = all species
+    SPECIES_INDEX: str = "exact"  # "ivf" = approximate search when no shortlist is set
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 16
 
 cfg = Config()
 
+# Capture manifest written by the rover's image store
+MANIFEST_NAME = "manifest.jsonl"
+# Classification results cache, inside Config.CACHE_DIR
+RESULTS_DB_NAME = "results.sqlite"
+
 # Default plant labels
 DEFAULT_LABELS = [
     "Annual meadow-grass", "Awned canary-grass", "Barley", "Barren brome", "Black bent",
@@ -60,37 +101,61 @@ DEFAULT_LABELS = [
 def launch_visualization_app():
     subprocess.Popen([sys.executable, "Data_Visulisation_App.py"])
 
-# Convert GPS coordinates to degrees
-def convert_to_degrees(value):
-    d = value[0][0] / value[0][1]
-    m = value[1][0] / value[1][1]
-    s = value[2][0] / value[2][1]
-    return d + (m / 60.0) + (s / 3600.0)
-
 # Extract geolocation from image metadata
 def get_geolocation(image_path):
+    location, _ = read_metadata(image_path)
+    return location or (None, None)
+
+# Read the rover's capture manifest (one JSON record per line), skipping torn lines
+def read_manifest(folder_path):
+    records = []
     try:
-        exif = piexif.load(image_path)
-        gps = exif.get("GPS", {})
-        if not gps:
-            return None, None
-        lat = gps.get(piexif.GPSIFD.GPSLatitude)
-        lat_ref = gps.get(piexif.GPSIFD.GPSLatitudeRef)
-        lon = gps.get(piexif.GPSIFD.GPSLongitude)
-        lon_ref = gps.get(piexif.GPSIFD.GPSLongitudeRef)
-        if lat and lat_ref and lon and lon_ref:
-            lat_ref = lat_ref.decode() if isinstance(lat_ref, bytes) else lat_ref
-            lon_ref = lon_ref.decode() if isinstance(lon_ref, bytes) else lon_ref
-            phi = convert_to_degrees(lat)
-            if lat_ref.upper() != 'N': phi = -phi
-            lam = convert_to_degrees(lon)
-            if lon_ref.upper() != 'E': lam = -lam
-            return phi, lam
-        return None, None
-    except Exception as e:
-        logging.getLogger(__name__).error(f"GPS extraction error for {image_path}: {e}")
-        logging.getLogger(__name__).debug(traceback.format_exc())
-        return None, None
+        with open(Path(folder_path) / MANIFEST_NAME, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return None
+    return records
+
+# List images in a folder: from the capture manifest when present, otherwise by a recursive scan
+def list_images(folder_path):
+    records = read_manifest(folder_path)
+    if records is not None:
+        by_path = {str(Path(folder_path) / rec["path"]): rec for rec in records if rec.get("path")}
+        return [Path(p) for p in by_path], by_path
+    return [Path(p) for p in sorted(scan_images(str(folder_path)))], {}
+
+# (lat, lon) recorded in a manifest record, if any
+def manifest_location(record):
+    if not record or record.get("latitude") is None or record.get("longitude") is None:
+        return None
+    return record["latitude"], record["longitude"]
+
+# Difference hash of an image, from a reduced-size grayscale decode
+def dhash_image(image_path, hash_size=8):
+    with Image.open(image_path) as img:
+        img.draft("L", (hash_size * 16, hash_size * 16))
+        gray = np.asarray(img.convert("L"))
+    return perceptual_hash.dhash_gray(gray, hash_size)
+
+# Drop images that are near-duplicates of a recently kept one (e.g. rover standing still)
+def filter_near_duplicates(image_paths, max_distance, history=32):
+    kept, recent = [], deque(maxlen=history)
+    for path in sorted(image_paths):
+        try:
+            h = dhash_image(path)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Hashing error for {path}: {e}")
+            kept.append(path)
+            continue
+        if any(perceptual_hash.hamming(h, other) <= max_distance for other in recent):
+            continue
+        recent.append(h)
+        kept.append(path)
+    return kept
 
 # ---------------------
 # Classifier Manager
@@ -99,84 +164,363 @@ class ClassifierManager:
     def __init__(self, cfg, labels):
         self.cfg = cfg
         self.custom = None
+        self.probe = None
         self.species = None
+        self.image_encoder = None  # traced vision tower when Config.TRACED_ENCODER is set
         self.labels = labels
+        self._decode_pool = None
+        self._decode_workers = None
 
-    # Load classifiers
+    # Load classifiers; both share one BioCLIP model, loaded once per session
     def load(self):
-        open_clip.create_model_and_transforms('hf-hub:imageomics/bioclip')
-        open_clip.get_tokenizer('hf-hub:imageomics/bioclip')
-        if self.labels:
-            self.custom = CustomLabelsClassifier(self.labels)
-        self.species = TreeOfLifeClassifier()
+        cache = EmbeddingCache(self.cfg.CACHE_DIR)
+        if self.cfg.CUSTOM_PROBE:
+            self.probe = LinearProbe.load(self.cfg.CUSTOM_PROBE)
+        elif self.labels:
+            self.custom = CachedCustomLabelsClassifier(self.labels, cache, shared_model=shared_model,
+                                                       quantize=self.cfg.QUANTIZE)
+        self.species = CachedTreeOfLifeClassifier(cache, shared_model=shared_model, quantize=self.cfg.QUANTIZE)
+        if self.cfg.SPECIES_SHORTLIST:
+            self.species.species_key = apply_shortlist(self.species, self.cfg.SPECIES_SHORTLIST, cache.cache_dir)
+        elif self.cfg.SPECIES_INDEX == "ivf":
+            self.species.species_index = load_ivf_index(self.species, cache.cache_dir, self.cfg.IVF_NLIST)
+            self.species.index_nprobe = self.cfg.IVF_NPROBE
+            self.species.species_key = f"ivf-{self.cfg.IVF_NLIST}-{self.cfg.IVF_NPROBE}"
+        if self.cfg.TRACED_ENCODER:
+            self.image_encoder = traced_visual_encoder(self.species.model, self.traced_encoder_path(),
+                                                       self.cfg.BATCH_SIZE)
+        if self.probe and self.probe.model_key != model_key(self.species.model_str, self.species.pretrained_str):
+            raise ValueError(f"{self.cfg.CUSTOM_PROBE} was trained on a different BioCLIP model")
+
+    # Where the traced vision encoder for the loaded model is kept
+    def traced_encoder_path(self):
+        key = model_key(self.species.model_str, self.species.pretrained_str, self.cfg.QUANTIZE)
+        return Path(self.cfg.CACHE_DIR) / f"visual-{key}-{self.species.device}-torch{torch.__version__}.pt"
+
+    # Labels identifying the custom stage in results cache versions
+    def custom_version_labels(self):
+        if self.probe:
+            return [f"probe-{self.probe.key}"]
+        return self.labels if self.custom else []
+
+    # Worker processes for the fast decode path. Created on first use and kept for the session,
+    # since starting them is slow under Windows spawn; replaced if a different size is asked for.
+    def decode_pool(self, workers):
+        if self._decode_pool is not None and self._decode_workers != workers:
+            self._decode_pool.shutdown()
+            self._decode_pool = None
+        if self._decode_pool is None:
+            self._decode_pool = ProcessPoolExecutor(max_workers=workers)
+            self._decode_workers = workers
+        return self._decode_pool
+
+    # Stop the decode worker processes
+    def close(self):
+        if self._decode_pool is not None:
+            self._decode_pool.shutdown()
+            self._decode_pool = None
 
 # ---------------------
 # Image Processing
 # ---------------------
-def process_image(image_path, manager: ClassifierManager, cfg: Config) -> dict:
-    try:
-        result = {
-            "filename": Path(image_path).name,
-            "image_path": image_path,
-            "latitude": None,
-            "longitude": None,
-            "custom_predictions": [],
-            "species_predictions": []
-        }
-        # Custom predictions
-        if manager.custom:
-            cpreds = manager.custom.predict(image_path)
-            valid_c = [p for p in cpreds if p.get("score", 0) >= cfg.CONF_THRESHOLD_CUSTOM]
-            if not valid_c:
-                valid_c = [{"classification": "Uncertain", "score": None}]
-            for p in valid_c:
-                score = p.get("score") or 0
-                p["plant_status"] = "harmful" if score >= cfg.HIGH_CONF_CUSTOM else "non-harmful"
-            result["custom_predictions"] = [
-                {"classification": p["classification"],
-                 "confidence": round(p.get("score", 0), 2) if p.get("score") is not None else None,
-                 "plant_status": p["plant_status"]}
-                for p in valid_c
-            ]
-        # Species predictions
-        spreds = manager.species.predict(image_path, Rank.SPECIES)
-        valid_s = [p for p in spreds if p.get("score", 0) >= cfg.HIGH_CONF_SPECIES]
-        if not valid_s:
-            valid_s = [max(spreds, key=lambda x: x.get("score", 0), default={"species": "Unknown", "score": None})]
-        result["species_predictions"] = [
-            {"species": p["species"],
-             "confidence": round(p.get("score", 0), 2) if p.get("score") is not None else None}
-            for p in valid_s
+
+# Encode a batch of preprocessed images with the BioCLIP vision tower both classifiers share
+@torch.no_grad()
+def encode_batch(batch, manager: ClassifierManager):
+    encoder = manager.image_encoder if manager.image_encoder is not None else manager.species.model.encode_image
+    features = encoder(batch.to(manager.species.device))
+    return F.normalize(features, dim=-1)
+
+# Whether images can skip the bioclip transforms for the fast decode path (BioCLIP's 224x224 squash)
+def use_fast_decode(manager: ClassifierManager, cfg: Config):
+    return cfg.FAST_DECODE and manager.species.preprocess is preprocess_img
+
+# Decode, preprocess and encode an image once
+def embed_image(image_path, manager: ClassifierManager):
+    if use_fast_decode(manager, manager.cfg):
+        array = decode_image(image_path)
+        if array is None:
+            raise ValueError(f"Cannot decode {image_path}")
+        return encode_batch(to_model_batch([array]), manager)
+    img = manager.species.ensure_rgb_image(image_path)
+    return encode_batch(manager.species.preprocess(img).unsqueeze(0), manager)
+
+# Probabilities of each embedding over the probe classes or custom labels (None without either)
+@torch.no_grad()
+def custom_probabilities(features, manager: ClassifierManager):
+    if manager.probe:
+        return manager.probe.probabilities(features)
+    if manager.custom:
+        return manager.custom.create_probabilities(features, manager.custom.txt_embeddings).cpu()
+    return None
+
+# Custom and Tree-of-Life species probabilities of each embedding
+@torch.no_grad()
+def score_features(features, manager: ClassifierManager):
+    return custom_probabilities(features, manager), manager.species.species_probabilities(features).cpu()
+
+# Ranked custom-label and top-5 species predictions from one image's probabilities
+def format_predictions(key, cprobs, sprobs, manager: ClassifierManager):
+    if cprobs is None:
+        cpreds = []
+    elif manager.probe:
+        cpreds = manager.probe.ranked(key, cprobs)
+    else:
+        cpreds = manager.custom.group_probs(key, cprobs, len(manager.custom.classes))
+    spreds = manager.species.format_species_probs(key, sprobs, k=5)
+    return cpreds, spreds
+
+# Score one normalized image embedding against both label sets
+def classify_embedding(features, key, manager: ClassifierManager):
+    cprobs, sprobs = score_features(features, manager)
+    return format_predictions(key, cprobs[0] if cprobs is not None else None, sprobs[0], manager)
+
+# Turn raw predictions into a result record (thresholds, harmful status, geolocation)
+def build_result(image_path, cpreds, spreds, cfg: Config, location=None) -> dict:
+    custom_predictions = []
+    # Custom predictions
+    if cpreds:
+        valid_c = [p for p in cpreds if p.get("score", 0) >= cfg.CONF_THRESHOLD_CUSTOM]
+        if not valid_c:
+            valid_c = [{"classification": "Uncertain", "score": None}]
+        for p in valid_c:
+            score = p.get("score") or 0
+            p["plant_status"] = "harmful" if score >= cfg.HIGH_CONF_CUSTOM else "non-harmful"
+        custom_predictions = [
+            {"classification": p["classification"],
+             "confidence": round(p.get("score", 0), 2) if p.get("score") is not None else None,
+             "plant_status": p["plant_status"]}
+            for p in valid_c
         ]
-        # Geolocation
+    # Species predictions
+    valid_s = [p for p in spreds if p.get("score", 0) >= cfg.HIGH_CONF_SPECIES]
+    if not valid_s:
+        valid_s = [max(spreds, key=lambda x: x.get("score", 0), default={"species": "Unknown", "score": None})]
+    species_predictions = [
+        {"species": p["species"],
+         "confidence": round(p.get("score", 0), 2) if p.get("score") is not None else None}
+        for p in valid_s
+    ]
+    return result_record(image_path, custom_predictions, species_predictions, location)
+
+# Result record for an image from its (thresholded) predictions and resolved location
+def result_record(image_path, custom_predictions, species_predictions, location=None) -> dict:
+    result = {
+        "filename": Path(image_path).name,
+        "image_path": image_path,
+        "latitude": None,
+        "longitude": None,
+        "custom_predictions": custom_predictions,
+        "species_predictions": species_predictions
+    }
+    lat, lon = location or (None, None)
+    result["latitude"] = round(lat, 6) if lat is not None else None
+    result["longitude"] = round(lon, 6) if lon is not None else None
+    return result
+
+def process_image(image_path, manager: ClassifierManager, cfg: Config, location=None) -> dict:
+    try:
         lat, lon = get_geolocation(image_path)
-        result["latitude"] = round(lat, 6) if lat is not None else None
-        result["longitude"] = round(lon, 6) if lon is not None else None
-        return result
+        if lat is not None and lon is not None:
+            location = (lat, lon)
+        features = embed_image(image_path, manager)
+        cpreds, spreds = classify_embedding(features, image_path, manager)
+        return build_result(image_path, cpreds, spreds, cfg, location)
     except Exception as e:
         logging.getLogger(__name__).error(f"Error processing {image_path}: {e}")
         logging.getLogger(__name__).debug(traceback.format_exc())
         return None
 
+# ---------------------
+# Batched Inference
+# ---------------------
+
+# Three-stage pipeline: decode/preprocess threads fill fixed-size tensor batches, a single
+# model worker (the calling thread) encodes whole batches, and post-processing fans back
+# out per image. Only one thread ever runs the model, so PyTorch's intra-op pool is not
+# oversubscribed by competing forward passes.
+class BatchInference:
+    def __init__(self, manager: ClassifierManager, cfg: Config, batch_size=None, decode_workers=None, num_threads=None):
+        self.manager = manager
+        self.cfg = cfg
+        self.batch_size = batch_size or cfg.BATCH_SIZE
+        self.decode_workers = decode_workers or cfg.DECODE_WORKERS
+        self.fast_decode = use_fast_decode(manager, cfg)
+        threads = num_threads if num_threads is not None else cfg.TORCH_THREADS
+        torch.set_num_threads(threads or os.cpu_count() or 1)
+
+    # Decode and preprocess one image to a CHW tensor; None if it cannot be read
+    def _load(self, image_path):
+        try:
+            img = self.manager.species.ensure_rgb_image(image_path)
+            return self.manager.species.preprocess(img)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error decoding {image_path}: {e}")
+            return None
+
+    # Producer: decode items in chunks of batch_size and queue (chunk, valid rows, tensor batch).
+    # The fast path decodes to uint8 arrays in the manager's worker processes and normalises the
+    # batch here, otherwise images are decoded on the thread pool. A chunk that fails as a whole
+    # (e.g. a decode worker died) is queued with no valid rows, so its images fail, not the run.
+    def _fill_batches(self, items, pool, batches, stop):
+        load = decode_image if self.fast_decode else self._load
+        try:
+            for start in range(0, len(items), self.batch_size):
+                if stop.is_set():
+                    return
+                chunk = items[start:start + self.batch_size]
+                rows, batch = [], None
+                try:
+                    decode_pool = self.manager.decode_pool(self.decode_workers) if self.fast_decode else pool
+                    decoded = list(decode_pool.map(load, [path for path, _ in chunk]))
+                    rows = [i for i, t in enumerate(decoded) if t is not None]
+                    if rows:
+                        valid = [decoded[i] for i in rows]
+                        batch = to_model_batch(valid) if self.fast_decode else torch.stack(valid)
+                except Exception as e:
+                    logging.getLogger(__name__).error(
+                        f"Error decoding batch from {chunk[0][0]} ({len(chunk)} images): {e}")
+                    logging.getLogger(__name__).debug(traceback.format_exc())
+                    rows, batch = [], None
+                    if isinstance(e, BrokenExecutor):
+                        self.manager.close()  # the next chunk starts fresh worker processes
+                batches.put((chunk, rows, batch))
+        finally:
+            batches.put(None)
+
+    # Build the result record for one image from its probability rows
+    def _postprocess(self, item, cprobs, sprobs):
+        image_path, location = item
+        try:
+            cpreds, spreds = format_predictions(image_path, cprobs, sprobs, self.manager)
+            return build_result(image_path, cpreds, spreds, self.cfg, location)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error processing {image_path}: {e}")
+            logging.getLogger(__name__).debug(traceback.format_exc())
+            return None
+
+    # Yield one result (or None on failure) per (image_path, location) item, in input order
+    def run(self, items):
+        items = list(items)
+        batches = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.decode_workers) as pool:
+            producer = threading.Thread(target=self._fill_batches, args=(items, pool, batches, stop),
+                                        daemon=True)
+            producer.start()
+            try:
+                while True:
+                    entry = batches.get()
+                    if entry is None:
+                        break
+                    chunk, rows, batch = entry
+                    futures = [None] * len(chunk)
+                    if batch is not None:
+                        try:
+                            cprobs, sprobs = score_features(encode_batch(batch, self.manager), self.manager)
+                        except Exception as e:
+                            # e.g. out of memory: fail this batch's images, not the whole folder
+                            logging.getLogger(__name__).error(
+                                f"Error classifying batch from {chunk[rows[0]][0]} ({len(rows)} images): {e}")
+                            logging.getLogger(__name__).debug(traceback.format_exc())
+                            rows = []
+                        for row, i in enumerate(rows):
+                            futures[i] = pool.submit(self._postprocess, chunk[i],
+                                                     cprobs[row] if cprobs is not None else None, sprobs[row])
+                    for fut in futures:
+                        yield fut.result() if fut else None
+            finally:
+                stop.set()
+                while producer.is_alive():
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
 # ---------------------
 # Folder Processing & JSON
 # ---------------------
-def process_folder(folder_path, manager, cfg, progress_callback=None):
-    image_paths = []
-    for ext in ("*.jpg", "*.jpeg", "*.png"):
-        image_paths.extend(Path(folder_path).glob(ext))
-    total = len(image_paths)
+def process_folder(folder_path, manager, cfg, progress_callback=None, dedupe=False, use_cache=True):
+    items = folder_items(folder_path, cfg, dedupe)
+    total = len(items)
     results = []
-    with ThreadPoolExecutor() as executor:
-        futures = {executor.submit(process_image, str(img), manager, cfg): img for img in image_paths}
-        for idx, fut in enumerate(as_completed(futures), start=1):
-            res = fut.result()
-            if res:
-                results.append(res)
-            if progress_callback:
-                progress_callback(idx, total)
+    for idx, res in enumerate(iter_results(items, manager, cfg, use_cache), start=1):
+        if res:
+            results.append(res)
+        if progress_callback:
+            progress_callback(idx, total)
     return results
 
+# (image_path, manifest location) for each image to classify in a folder
+def folder_items(folder_path, cfg, dedupe=False):
+    image_paths, records = list_images(folder_path)
+    if dedupe:
+        before = len(image_paths)
+        image_paths = filter_near_duplicates(image_paths, cfg.DEDUPE_MAX_DISTANCE)
+        logging.getLogger(__name__).info(f"Skipped {before - len(image_paths)} near-duplicate images")
+    return [(str(img), manifest_location(records.get(str(img)))) for img in image_paths]
+
+# Classify (image_path, location) items, yielding each result (None on failure) in input order.
+# Items are handled in chunks so only one chunk of results is held in memory at a time. Each
+# chunk first goes through the image index for content hashes and EXIF GPS, which takes
+# precedence over the manifest location, so inference workers never touch metadata.
+def iter_results(items, manager, cfg, use_cache=True, chunk_size=1024):
+    log = logging.getLogger(__name__)
+    index = ImageIndex(str(Path(cfg.CACHE_DIR) / INDEX_DB_NAME), cfg.INDEX_WORKERS)
+    cache = ResultsCache(str(Path(cfg.CACHE_DIR) / RESULTS_DB_NAME)) if use_cache else None
+    version = None
+    if cache:
+        version = results_version(manager.species.model_str, manager.species.pretrained_str,
+                                  manager.custom_version_labels(), cfg, manager.species.species_key)
+    engine = BatchInference(manager, cfg)
+    inferred = reused = 0
+    try:
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            records = index.update(path for path, _ in chunk)
+            chunk = [(path, (records[path].location or location) if path in records else location)
+                     for path, location in chunk]
+            results = [None] * len(chunk)
+            hashes = [records[path].sha1 if path in records else None for path, _ in chunk]
+            known = {}
+            # Look up previously classified image contents
+            if cache:
+                known = cache.get_many([h for h in hashes if h], version)
+            # Run inference once per unseen image content; copies reuse its result below
+            pending, queued = [], set()
+            for i, h in enumerate(hashes):
+                if h is None or (h not in known and h not in queued):
+                    pending.append(i)
+                    queued.add(h)
+            # Yield each result as soon as it and everything before it are ready
+            def finish(i):
+                if results[i] is None and hashes[i] in known:
+                    results[i] = result_record(chunk[i][0], *known[hashes[i]], chunk[i][1])
+                return results[i]
+            pos = 0
+            while pos < (pending[0] if pending else len(chunk)):
+                yield finish(pos)
+                pos += 1
+            stops = pending[1:] + [len(chunk)]
+            for res, i, stop in zip(engine.run(chunk[i] for i in pending), pending, stops):
+                results[i] = res
+                if res and hashes[i]:
+                    known[hashes[i]] = (res["custom_predictions"], res["species_predictions"])
+                    if cache:
+                        cache.put(hashes[i], version, *known[hashes[i]])
+                while pos < stop:
+                    yield finish(pos)
+                    pos += 1
+            if cache:
+                cache.commit()
+            inferred += len(pending)
+            reused += len(chunk) - len(pending)
+    finally:
+        index.close()
+        if cache:
+            cache.close()
+        log.info(f"Classified {inferred} images, reused results for {reused}")
+
 # Save results to JSON
 def write_json(results):
     output_file = filedialog.asksaveasfilename(
@@ -203,7 +547,7 @@ class ImageClassifierApp:
     def __init__(self, master):
         self.master = master
         master.title("Plant Image Classifier")
-        master.geometry("550x420")
+        master.geometry("550x450")
         self.style = Style()
         self.style.theme_use("default")
         self.style.configure("blue.Horizontal.TProgressbar", background='blue')
@@ -229,6 +573,8 @@ class ImageClassifierApp:
         self.progress.pack(pady=10)
         self.progress_label = Label(master, text="Progress: 0%")
         self.progress_label.pack(pady=5)
+        self.dedupe_var = BooleanVar(value=False)
+        Checkbutton(master, text="Skip near-duplicate images", variable=self.dedupe_var).pack()
         self.process_btn = Button(master, text="Process Images", command=self.start_processing, state="disabled")
         self.process_btn.pack(pady=10)
         Button(master, text="Launch Visualization App", command=launch_visualization_app).pack(pady=5)
@@ -278,6 +624,8 @@ class ImageClassifierApp:
 
     # Load classifier
     def load_classifier(self):
+        if self.manager:
+            self.manager.close()
         self.manager = ClassifierManager(cfg, self.labels)
         threading.Thread(target=self._load_thread, daemon=True).start()
         self.status_label.config(text="Loading model...")
@@ -316,11 +664,13 @@ class ImageClassifierApp:
             return
         self.select_btn.config(state="disabled")
         self.process_btn.config(state="disabled")
-        threading.Thread(target=self._process_thread, daemon=True).start()
+        # Tk variables may only be read on the main thread
+        threading.Thread(target=self._process_thread, args=(self.dedupe_var.get(),), daemon=True).start()
 
-    def _process_thread(self):
+    def _process_thread(self, dedupe):
         results = process_folder(self.folder_path, self.manager, cfg,
-                                 progress_callback=lambda c, t: self.master.after(0, self.update_progress, c, t))
+                                 progress_callback=lambda c, t: self.master.after(0, self.update_progress, c, t),
+                                 dedupe=dedupe)
         if results:
             out = write_json(results)
             if out:
@@ -340,6 +690,8 @@ def main():
     root = Tk()
     app = ImageClassifierApp(root)
     root.mainloop()
+    if app.manager:
+        app.manager.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,76 @@
+"""
+Plant map for the visualisation app.
+
+Plants are drawn by two FastMarkerCluster layers, harmful and non-harmful, instead of a
+folium.Marker and Popup per plant. Each layer is one JavaScript array of compact rows
+[lat, lon, thumbnail URL, species, custom classifications] and a callback that makes
+the marker in the browser. The popup HTML is built from the row only when a popup is
+opened. The generated page therefore holds the data once, not a marker, icon and popup
+definition per plant, and Leaflet.markercluster only puts the visible clusters in the DOM.
+Harmful plants get their own layer, so their clusters are never hidden inside
+non-harmful ones.
+
+Plants are rows as produced by the app's parse_plant_data:
+{"lat", "lon", "image_path", "species": [(name, confidence)], "custom": [(label, confidence)]}.
+"""
+import json
+
+import folium
+from folium.plugins import FastMarkerCluster
+
+HARMFUL_TEXT = "Identified in custom labels and is likely harmful"
+NONHARMFUL_TEXT = "Not identified in custom labels and is likely not harmful"
+
+# Leaflet callback for one layer: a marker per row whose popup is built when opened
+MARKER_CALLBACK = """(function () {
+    var icon = L.AwesomeMarkers.icon({markerColor: %(color)s, icon: %(icon)s, prefix: "fa"});
+    var escape = function (text) {
+        return String(text).replace(/[&<>"']/g, function (c) {
+            return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+        });
+    };
+    var list = function (preds) {
+        return preds.map(function (p) { return escape(p[0]) + " (" + p[1].toFixed(2) + ")"; }).join(", ");
+    };
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindPopup(function () {
+            var img = row[2] ? '<img src="' + escape(row[2]) + '" loading="lazy" width="150" height="150"><br>' : "";
+            return img + "<b>Species:</b> " + list(row[3]) + "<br><b>Classifications:</b> " + list(row[4])
+                + "<br>" + %(status)s;
+        }, {maxWidth: 400});
+        return marker;
+    };
+})()"""
+
+
+# Compact marker rows for plants with a species at or above min_confidence. Coordinates are
+# rounded to 6 decimal places (about 0.1 m) and confidences to the 2 shown in the popup.
+def marker_rows(plants, min_confidence, thumbnails):
+    rows = []
+    for plant in plants:
+        preds = [[name, round(conf, 2)] for name, conf in plant["species"] if conf >= min_confidence]
+        if not preds:
+            continue
+        custom = [[label or "Unknown", round(conf, 2)] for label, conf in plant["custom"]]
+        rows.append([round(plant["lat"], 6), round(plant["lon"], 6), thumbnails.get(plant["image_path"], ""),
+                     preds, custom])
+    return rows
+
+
+# Layer of plants with the given marker colour, icon and popup status line
+def plant_layer(plants, min_confidence, thumbnails, name, color, icon, status):
+    callback = MARKER_CALLBACK % {"color": json.dumps(color), "icon": json.dumps(icon), "status": json.dumps(status)}
+    return FastMarkerCluster(marker_rows(plants, min_confidence, thumbnails), callback=callback, name=name)
+
+
+# Map of harmful and non-harmful plants; thumbnails maps image paths to popup image URLs
+def make_plant_map(harmful, nonharmful, bounds, min_confidence, thumbnails):
+    plant_map = folium.Map()
+    plant_layer(harmful, min_confidence, thumbnails, "Harmful", "red", "exclamation-triangle",
+                HARMFUL_TEXT).add_to(plant_map)
+    plant_layer(nonharmful, min_confidence, thumbnails, "Non-Harmful", "green", "leaf",
+                NONHARMFUL_TEXT).add_to(plant_map)
+    folium.LayerControl().add_to(plant_map)
+    plant_map.fit_bounds(bounds)
+    return plant_map
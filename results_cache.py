@@ -0,0 +1,75 @@
+"""
+Content-addressed cache of classification results in SQLite.
+
+Results are keyed by the SHA-1 of the image bytes plus a version string covering the
+model, label set and thresholds, so copies of a photo in several folders share one
+entry and any change to the classifier set-up misses the cache instead of returning
+stale predictions. Content hashes come from the image index (image_index.py), which
+only re-reads files whose size or mtime changed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from dataclasses import asdict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    sha1 TEXT NOT NULL,
+    version TEXT NOT NULL,
+    custom_predictions TEXT NOT NULL,
+    species_predictions TEXT NOT NULL,
+    PRIMARY KEY (sha1, version)
+);
+"""
+
+
+# Version string for everything that affects a result other than the image itself
+# (model, labels, thresholds, INT8 mode, decode path and species shortlist/index)
+def results_version(model_str, pretrained_str, labels, cfg, species_key=None):
+    thresholds = {name: value for name, value in asdict(cfg).items()
+                  if name.startswith(("CONF_THRESHOLD", "HIGH_CONF", "QUANTIZE", "FAST_DECODE"))}
+    text = json.dumps([model_str, pretrained_str, sorted(labels or []), thresholds, species_key], sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# SHA-1 of a file's contents, read in chunks
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultsCache:
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    # {sha1: (custom_predictions, species_predictions)} for the hashes that are cached
+    def get_many(self, hashes, version):
+        found = {}
+        hashes = list(set(hashes))
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT sha1, custom_predictions, species_predictions FROM results "
+                f"WHERE version = ? AND sha1 IN ({','.join('?' * len(chunk))})", [version, *chunk])
+            for sha1, custom, species in rows:
+                found[sha1] = (json.loads(custom), json.loads(species))
+        return found
+
+    def put(self, sha1, version, custom_predictions, species_predictions):
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        (sha1, version, json.dumps(custom_predictions), json.dumps(species_predictions)))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,166 @@
+"""
+Faster Tree-of-Life species scoring.
+
+A shortlist restricts species scoring to the taxa we can actually meet (e.g. UK arable
+and hedgerow flora). It is read from a CSV whose first column is named after a rank
+(kingdom ... genus, species), the same layout bioclip's create_taxa_filter_from_csv uses,
+and the matching rows are precomputed into a compact embedding submatrix cached on disk.
+
+When the full species set is needed, IVFIndex is an inverted-file approximate nearest
+neighbour index in NumPy: species embeddings are clustered with spherical k-means and each
+image is only scored against the rows of its nprobe closest clusters.
+"""
+import csv
+import hashlib
+import json
+import logging
+import time
+
+import numpy as np
+import torch
+from bioclip import Rank
+
+from embedding_cache import model_key, save_atomic
+
+log = logging.getLogger(__name__)
+
+
+# Value of one taxonomic rank for a Tree-of-Life name entry ([[kingdom, ..., genus, epithet], common])
+def taxon_value(names, rank: Rank):
+    scientific = names[0]
+    if rank == Rank.SPECIES:
+        return f"{scientific[-2]} {scientific[-1]}"
+    return scientific[rank.value]
+
+
+# (rank, values) from a shortlist CSV whose first column header is a rank name
+def read_shortlist(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        raise ValueError(f"Species shortlist {csv_path} is empty")
+    column = rows[0][0].strip().lower()
+    ranks = {rank.get_label(): rank for rank in Rank}
+    if column not in ranks:
+        raise ValueError(f"The first column of {csv_path} is named '{column}' but must be one of {', '.join(ranks)}")
+    values = {row[0].strip() for row in rows[1:] if row and row[0].strip()}
+    return ranks[column], values
+
+
+# Row indices of the species matching a shortlist; unknown values are logged, not fatal
+def shortlist_indices(txt_names, rank: Rank, values):
+    indices = [i for i, names in enumerate(txt_names) if taxon_value(names, rank) in values]
+    known = {taxon_value(txt_names[i], rank) for i in indices}
+    unknown = sorted(values - known)
+    if unknown:
+        log.warning(f"{len(unknown)} shortlist {rank.get_label()} values not in the Tree of Life: {', '.join(unknown)}")
+    return np.array(indices, dtype=np.int64)
+
+
+# Restrict a CachedTreeOfLifeClassifier to a shortlist, reusing the cached submatrix when present.
+# Returns a key identifying the shortlist contents.
+def apply_shortlist(classifier, csv_path, cache_dir):
+    with open(csv_path, "rb") as f:
+        digest = hashlib.sha1(f.read())
+    digest.update(model_key(classifier.model_str, classifier.pretrained_str).encode())
+    key = digest.hexdigest()[:16]
+    index_path = cache_dir / f"shortlist-{key}-rows.npy"
+    matrix_path = cache_dir / f"shortlist-{key}-embeddings.npy"
+    if index_path.exists() and matrix_path.exists():
+        indices = np.load(index_path)
+        matrix = np.load(matrix_path, mmap_mode="c")
+    else:
+        rank, values = read_shortlist(csv_path)
+        indices = shortlist_indices(classifier.txt_names, rank, values)
+        if not len(indices):
+            raise ValueError(f"No Tree-of-Life species match the shortlist in {csv_path}")
+        matrix = np.ascontiguousarray(classifier.txt_embeddings.numpy()[:, indices], dtype=np.float32)
+        save_atomic(matrix_path, matrix)
+        save_atomic(index_path, indices)
+    classifier.apply_subset(indices, torch.from_numpy(matrix))
+    log.info(f"Species shortlist: {len(indices)} of {len(classifier.txt_names)} species")
+    return f"shortlist-{key}"
+
+
+class IVFIndex:
+    def __init__(self, centroids, offsets, order, vectors):
+        self.centroids = centroids  # [nlist, dim]
+        self.offsets = offsets      # [nlist + 1] start of each list in order/vectors
+        self.order = order          # [N] species row for each position
+        self.vectors = vectors      # [N, dim] species embeddings in list order
+        self.size = len(order)
+
+    # Build from a [dim, N] species matrix (e.g. a memory map) into folder; returns the index
+    @classmethod
+    def build(cls, embeddings, folder, nlist=1024, iters=10, sample=65536, chunk=16384, seed=0):
+        start = time.perf_counter()
+        embeddings = np.asarray(embeddings)
+        dim, size = embeddings.shape
+        nlist = min(nlist, size)
+        rng = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample
+        train = np.ascontiguousarray(embeddings[:, np.sort(rng.choice(size, min(sample, size), replace=False))].T,
+                                     dtype=np.float32)
+        centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            empty = ~sums.any(axis=1)
+            sums[empty] = train[rng.choice(len(train), int(empty.sum()), replace=False)]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        # Assign every species to its closest centroid, then lay vectors out list by list
+        assign = np.empty(size, dtype=np.int32)
+        for i in range(0, size, chunk):
+            block = np.asarray(embeddings[:, i:i + chunk].T, dtype=np.float32)
+            assign[i:i + chunk] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+
+        folder.mkdir(parents=True, exist_ok=True)
+        vectors_tmp = folder / "vectors.npy.tmp"
+        vectors = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(size, dim))
+        for i in range(0, size, chunk):
+            rows = order[i:i + chunk]
+            sorted_rows = np.sort(rows)
+            block = np.asarray(embeddings[:, sorted_rows].T, dtype=np.float32)
+            vectors[i:i + len(rows)] = block[np.searchsorted(sorted_rows, rows)]
+        vectors.flush()
+        del vectors
+        vectors_tmp.replace(folder / "vectors.npy")
+        save_atomic(folder / "centroids.npy", centroids)
+        save_atomic(folder / "offsets.npy", offsets)
+        save_atomic(folder / "order.npy", order)
+        with open(folder / "index.json", "w") as f:
+            json.dump({"nlist": nlist, "size": size, "dim": dim}, f)
+        log.info(f"Built IVF index ({nlist} lists over {size} species) in {time.perf_counter() - start:.1f} s")
+        return cls.load(folder)
+
+    @classmethod
+    def load(cls, folder):
+        return cls(np.load(folder / "centroids.npy"), np.load(folder / "offsets.npy"),
+                   np.load(folder / "order.npy"), np.load(folder / "vectors.npy", mmap_mode="r"))
+
+    # Dense [B, N] softmax probabilities, computed only over the rows of the nprobe closest
+    # lists; every other species gets probability 0. The softmax is normalised over the
+    # candidates, which is close to exact because the logit scale makes it very peaked.
+    def probabilities(self, features, logit_scale, nprobe=16):
+        queries = features.detach().cpu().numpy().astype(np.float32)
+        probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        probs = torch.zeros((len(queries), self.size), dtype=torch.float32)
+        for b, lists in enumerate(probe):
+            positions = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in np.sort(lists)])
+            logits = torch.from_numpy(logit_scale * (self.vectors[positions] @ queries[b]))
+            probs[b, torch.from_numpy(self.order[positions])] = torch.softmax(logits, dim=0)
+        return probs
+
+
+# IVF index for a classifier's full species matrix, built into the cache on first use
+def load_ivf_index(classifier, cache_dir, nlist=1024):
+    folder = cache_dir / f"ivf-{model_key(classifier.model_str, classifier.pretrained_str)}-{nlist}"
+    if (folder / "index.json").exists():
+        return IVFIndex.load(folder)
+    log.info(f"Building species IVF index with {nlist} lists (one-off)")
+    return IVFIndex.build(classifier.txt_embeddings.numpy(), folder, nlist=nlist)
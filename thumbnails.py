@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Thumbnail cache for the plant map popups.
+
+Popups used to inline each full-resolution photo as base64, so the map page grew with
+the size of the photos. Instead, a small square JPEG is written once per image into
+THUMBNAIL_DIR (static/thumbnails, next to the app) and the popup links to it through
+Streamlit's static file serving (.streamlit/config.toml: server.enableStaticServing).
+Thumbnails are named by a hash of the image's absolute path, size and mtime, so an
+edited or replaced photo gets a new thumbnail and unchanged ones are never regenerated.
+Decoding uses PIL draft mode, like image_decode.decode_image, so libjpeg scales the
+photo down while decoding.
+
+Thumbnails are generated on demand by the app; they can also be made ahead of time:
+
+    python thumbnails.py "Test data/Hawthorn" "Test data/Rhodedron"
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from folder_watch import scan_images
+
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "thumbnails")
+THUMBNAIL_URL = "app/static/thumbnails"  # THUMBNAIL_DIR as served by Streamlit
+THUMBNAIL_SIZE = 300  # px, shown at 150 px in popups so it stays sharp on high-DPI screens
+THUMBNAIL_QUALITY = 80
+
+log = logging.getLogger(__name__)
+
+
+# Cache file name for an image at its current size and mtime
+def thumbnail_name(path, st):
+    key = f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg"
+
+
+# File name of the image's thumbnail in thumb_dir, writing it if missing; None if the image cannot be read
+def ensure_thumbnail(path, thumb_dir=THUMBNAIL_DIR, size=THUMBNAIL_SIZE):
+    try:
+        name = thumbnail_name(path, os.stat(path))
+    except OSError:
+        return None
+    target = os.path.join(thumb_dir, name)
+    if os.path.exists(target):
+        return name
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (size, size))
+            img = ImageOps.exif_transpose(img)
+            thumb = ImageOps.fit(img.convert("RGB"), (size, size), Image.BILINEAR)
+        os.makedirs(thumb_dir, exist_ok=True)
+        # Unique temporary name: several threads or app sessions may write the same thumbnail
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=thumb_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                thumb.save(f, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        log.error(f"Cannot make thumbnail for {path}: {e}")
+        return None
+    return name
+
+
+# {path: thumbnail file name or None} for the given image paths, made on a thread pool
+def ensure_thumbnails(paths, thumb_dir=THUMBNAIL_DIR, size=THUMBNAIL_SIZE, workers=4):
+    paths = list(dict.fromkeys(p for p in paths if p))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        names = pool.map(lambda p: ensure_thumbnail(p, thumb_dir, size), paths)
+        return dict(zip(paths, names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--dir", default=THUMBNAIL_DIR)
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    for folder in args.folders:
+        start = time.perf_counter()
+        names = ensure_thumbnails(sorted(scan_images(folder)), args.dir, args.size, args.workers)
+        made = sum(name is not None for name in names.values())
+        log.info(f"{folder}: {made} of {len(names)} thumbnails in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Check that the shared-embedding classification path matches the per-classifier predict() path.
+
+For every image, the old path runs manager.custom.predict() and manager.species.predict()
+(each decodes and encodes the image itself); the new path embeds the image once and scores
+it against both label sets. Labels must match in order and scores within --tolerance.
+Both paths use BioCLIP's preprocess (Config.FAST_DECODE off), so they see the same input.
+
+    python verify_shared_embedding.py "Test data"
+"""
+import argparse
+import dataclasses
+import sys
+import time
+
+from bioclip import Rank
+
+from plant_classifier_gui import (ClassifierManager, DEFAULT_LABELS, cfg, classify_embedding,
+                                  embed_image, list_images)
+
+
+def compare(old, new, name_key, tolerance):
+    """Return a description of the first difference between two prediction lists, or None."""
+    if len(old) != len(new):
+        return f"{len(old)} vs {len(new)} predictions"
+    for rank, (a, b) in enumerate(zip(old, new)):
+        if a[name_key] != b[name_key]:
+            return f"rank {rank}: {a[name_key]} vs {b[name_key]}"
+        if abs(a["score"] - b["score"]) > tolerance:
+            return f"rank {rank} ({a[name_key]}): score {a['score']:.6f} vs {b['score']:.6f}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folders", nargs="+", help="Image folders to check")
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    # predict() decodes with BioCLIP's own preprocess, so the shared path must too; the fast
+    # decode path (draft decode, EXIF orientation) is checked against its reference in bench_decode.py
+    manager = ClassifierManager(dataclasses.replace(cfg, FAST_DECODE=False), DEFAULT_LABELS)
+    manager.load()
+
+    checked, mismatches = 0, 0
+    old_seconds = new_seconds = 0.0
+    for folder in args.folders:
+        image_paths, _ = list_images(folder)
+        for path in sorted(str(p) for p in image_paths):
+            start = time.perf_counter()
+            old_custom = manager.custom.predict(path)
+            old_species = manager.species.predict(path, Rank.SPECIES)
+            old_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            new_custom, new_species = classify_embedding(embed_image(path, manager), path, manager)
+            new_seconds += time.perf_counter() - start
+
+            checked += 1
+            for stage, diff in (("custom", compare(old_custom, new_custom, "classification", args.tolerance)),
+                                ("species", compare(old_species, new_species, "species", args.tolerance))):
+                if diff:
+                    mismatches += 1
+                    print(f"MISMATCH {path} [{stage}] {diff}")
+
+    if not checked:
+        print("No images found.")
+        return 1
+    print(f"Checked {checked} images, {mismatches} mismatches")
+    print(f"predict() x2:      {1000 * old_seconds / checked:7.1f} ms/image")
+    print(f"shared embedding:  {1000 * new_seconds / checked:7.1f} ms/image")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())